@@ -1,8 +1,9 @@
 from fastapi import FastAPI, HTTPException, WebSocket
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from supabase import create_client
 from dotenv import load_dotenv
+import asyncio
 import os
 import sys
 import datetime
@@ -10,6 +11,20 @@ import datetime
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 
 from chatbot.src.main import assistant
+from chatbot.src.llm_utils import close_async_client, llm_client_stats
+from chatbot.src.intent_cache import intent_cache_stats
+from chatbot.src.intent_classifier import intent_classifier_stats
+from chatbot.src.inventory_cache import (
+    apply_inventory_deltas,
+    get_store_inventory,
+    inventory_cache_stats,
+)
+from chatbot.src.search_service import (
+    loop_lag_monitor,
+    search_service,
+    search_service_stats,
+)
+from chatbot.src.speculative_search import speculative_search_stats
 
 # Supabase config
 load_dotenv()
@@ -31,8 +46,33 @@ class ChatMessage(BaseModel):
     role: str
     created_at: Optional[str] = None
 
+class InventoryDelta(BaseModel):
+    op: str = "update"
+    name: Optional[str] = None
+    location: Optional[str] = None
+    Category: Optional[str] = None
+    availableQuantity: Optional[int] = None
+    weightInGms: Optional[int] = None
+    quantity: Optional[int] = None
+    outOfStock: Optional[bool] = None
+
+class InventoryDeltaBatch(BaseModel):
+    deltas: List[InventoryDelta]
+
 # Routes
 
+@api.on_event("startup")
+async def startup():
+    loop_lag_monitor.start()
+
+
+@api.on_event("shutdown")
+async def shutdown():
+    loop_lag_monitor.stop()
+    search_service.shutdown()
+    await close_async_client()
+
+
 @api.get("/")
 def index():
     return {"message": "Hello from the samAPI"}
@@ -42,6 +82,8 @@ def index():
 async def ask_sam(websocket: WebSocket):
     await websocket.accept()
     store_id = websocket.query_params.get("store_id")
+    # Clients that render partial replies opt in with ?stream=1
+    stream = websocket.query_params.get("stream") == "1"
 
     async def send(text):
         await websocket.send_text(text)
@@ -60,7 +102,9 @@ async def ask_sam(websocket: WebSocket):
         await send("Please scan the QR")
         await websocket.close()
     else:
-        await assistant(send, receive, csv_url)
+        # Load (or revalidate) the store's inventory off the event loop
+        await asyncio.to_thread(get_store_inventory, csv_url)
+        await assistant(send, receive, csv_url, stream=stream)
         await websocket.close(1000)
 
 
@@ -91,3 +135,53 @@ def add_chats(message: ChatMessage):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@api.post("/api/v1/stores/{store_id}/inventory/deltas")
+def ingest_inventory_deltas(store_id: str, batch: InventoryDeltaBatch):
+    try:
+        result = supabase.from_("stores_data").select("csv_file").eq("id", store_id).execute()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not result.data or not (result.data[0].get("csv_file") or "").strip():
+        raise HTTPException(status_code=404, detail="Store not found")
+
+    deltas = [delta.model_dump(exclude_none=True) for delta in batch.deltas]
+    # Applied to this worker's inventory cache only; other API workers keep
+    # serving the store as they last loaded it
+    try:
+        version = apply_inventory_deltas(result.data[0]["csv_file"], deltas)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"status": "success", "version": version}
+
+
+@api.get("/api/v1/inventory-cache/stats")
+def get_inventory_cache_stats():
+    return inventory_cache_stats()
+
+
+@api.get("/api/v1/intent-cache/stats")
+def get_intent_cache_stats():
+    return intent_cache_stats()
+
+
+@api.get("/api/v1/intent-classifier/stats")
+def get_intent_classifier_stats():
+    return intent_classifier_stats()
+
+
+@api.get("/api/v1/search-service/stats")
+def get_search_service_stats():
+    return search_service_stats()
+
+
+@api.get("/api/v1/speculative-search/stats")
+def get_speculative_search_stats():
+    return speculative_search_stats()
+
+
+@api.get("/api/v1/llm/stats")
+def get_llm_stats():
+    return llm_client_stats()
@@ -1 +1 @@
-__all__= ["audio_utils", "conversational_handler", "llm_utils", "main", "product_recommendation", "product_search", "recipe_fetcher", "utils"]
\ No newline at end of file
+__all__= ["audio_utils", "category_views", "conversational_handler", "fuzzy_match", "ingredient_map", "ingredient_names", "intent_cache", "intent_classifier", "inventory_cache", "inventory_fetch", "inventory_snapshot", "llm_resilience", "llm_utils", "main", "product_index", "product_recommendation", "product_search", "recipe_fetcher", "recipe_index", "recipe_ranking", "recipe_store", "response_templates", "search_service", "speculative_search", "store_inventory", "utils"]
\ No newline at end of file
@@ -0,0 +1,94 @@
+import numpy as np
+
+
+class CategoryView:
+    """Row ids of one category, split out once so lookups need no scan."""
+
+    __slots__ = ("name", "rows", "available_rows", "has_out_of_stock")
+
+    def __init__(self, name, rows, available_rows, has_out_of_stock):
+        self.name = name
+        self.rows = rows
+        self.available_rows = available_rows
+        self.has_out_of_stock = has_out_of_stock
+
+    @property
+    def available_count(self):
+        return len(self.available_rows)
+
+
+class CategoryViews:
+    """Per-category aggregates of a store inventory, computed in one pass.
+
+    Categories keep the order in which they first appear in the inventory,
+    and each view's rows stay in inventory order, so slicing
+    ``available_rows`` gives the same top-N list as filtering the frame.
+    Rows in ``removed`` are left out of every view.
+    """
+
+    def __init__(self, frame, removed=()):
+        codes = frame["Category"].cat.codes.to_numpy()
+        categories = frame["Category"].cat.categories
+        available = (~frame["outOfStock"].to_numpy()) & (
+            frame["availableQuantity"].to_numpy() > 0
+        )
+        out_of_stock = frame["outOfStock"].to_numpy()
+        alive = np.ones(len(frame), dtype=bool)
+        alive[list(removed)] = False
+
+        # A stable sort groups rows by category while keeping row order
+        order = np.argsort(codes, kind="stable")
+        counts = np.bincount(codes[codes >= 0], minlength=len(categories))
+        bounds = np.concatenate(([0], np.cumsum(counts)))
+        start = int(np.searchsorted(codes[order], 0))
+
+        present, first_rows = np.unique(codes, return_index=True)
+        present = present[np.argsort(first_rows)]
+
+        self._views = {}
+        for code in present.tolist():
+            if code < 0:
+                continue
+            rows = order[start + bounds[code] : start + bounds[code + 1]]
+            rows = rows[alive[rows]]
+            self._views[categories[code]] = CategoryView(
+                categories[code],
+                rows,
+                rows[available[rows]],
+                bool(out_of_stock[rows].any()),
+            )
+
+    def updated(self, frame, changed_rows):
+        """Return views with availability recomputed for the categories of rows whose stock changed.
+
+        These views are left as they are, for readers still using them.
+        """
+        categories = frame["Category"].cat.categories
+        codes = frame["Category"].cat.codes.to_numpy()
+        out_of_stock = frame["outOfStock"].to_numpy()
+        quantities = frame["availableQuantity"].to_numpy()
+        views = CategoryViews.__new__(CategoryViews)
+        views._views = dict(self._views)
+        for code in set(codes[changed_rows].tolist()):
+            view = views._views.get(categories[code]) if code >= 0 else None
+            if view is None:
+                continue
+            rows = view.rows
+            views._views[view.name] = CategoryView(
+                view.name,
+                rows,
+                rows[~out_of_stock[rows] & (quantities[rows] > 0)],
+                bool(out_of_stock[rows].any()),
+            )
+        return views
+
+    def get(self, category):
+        """Return the view for a category, or None if the store has none."""
+        return self._views.get(category)
+
+    def __iter__(self):
+        return iter(self._views.values())
+
+    def memory_usage(self):
+        """Bytes held by the row-id arrays of all views."""
+        return sum(view.rows.nbytes + view.available_rows.nbytes for view in self)
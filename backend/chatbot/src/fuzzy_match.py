@@ -0,0 +1,89 @@
+import difflib
+import heapq
+
+import numpy as np
+
+from .product_index import name_trigrams, normalize_name
+
+# Upper bound on how many rows are scored exactly for one query
+MAX_FUZZY_CANDIDATES = 100
+
+
+class FuzzyMatcher:
+    """Close-match search over a ProductIndex, a drop-in for difflib.get_close_matches.
+
+    Candidates come from the index's trigram posting lists, filtered by the
+    length bound implied by the cutoff. Only the survivors are scored with
+    difflib's ratio, so the cutoff keeps its meaning while the work per
+    query depends on the matching rows rather than on the catalog size.
+
+    When more than ``max_candidates`` rows survive, the ones kept are those
+    with the highest Dice overlap of trigrams, 2 * shared / (query trigrams
+    + row trigrams), where a row's name length stands in for its trigram
+    count. Unlike the raw shared count this doesn't favour long names, but
+    it is still a pre-filter: past the cap a row difflib would rank in the
+    top n can in principle be left out.
+    """
+
+    def __init__(self, index, max_candidates=MAX_FUZZY_CANDIDATES, lengths=None):
+        self.index = index
+        self.max_candidates = max_candidates
+        if lengths is None:
+            lengths = np.fromiter(
+                (len(name) for name in index.norm_names),
+                dtype=np.int32,
+                count=len(index),
+            )
+        self.lengths = lengths
+
+    def memory_usage(self):
+        """Bytes held by the matcher on top of the index it searches."""
+        return self.lengths.nbytes
+
+    def extended(self, index, norm_names=()):
+        """Return a matcher over ``index``, whose rows are this one's plus norm_names."""
+        lengths = self.lengths
+        if norm_names:
+            added = np.fromiter((len(name) for name in norm_names), dtype=np.int32)
+            lengths = np.concatenate((lengths, added))
+        return FuzzyMatcher(index, self.max_candidates, lengths)
+
+    def close_matches(self, query, n=3, cutoff=0.6):
+        """Return up to n row ids whose names score at least cutoff, best first."""
+        query = normalize_name(query)
+        if not query:
+            return []
+
+        query_grams = name_trigrams(query)
+        postings = [self.index.posting(gram) for gram in query_grams]
+        postings = [rows for rows in postings if len(rows)]
+        if not postings:
+            return []
+        rows, shared = np.unique(np.concatenate(postings), return_counts=True)
+
+        # ratio() can never exceed 2 * min(len) / (len_a + len_b)
+        query_len = len(query)
+        lengths = self.lengths[rows]
+        keep = 2 * np.minimum(lengths, query_len) >= cutoff * (lengths + query_len)
+        rows, shared, lengths = rows[keep], shared[keep], lengths[keep]
+        if len(rows) > self.max_candidates:
+            # A padded name of length L has at most L trigrams
+            dice = 2 * shared / (len(query_grams) + lengths)
+            top = np.argpartition(-dice, self.max_candidates)[: self.max_candidates]
+            rows = rows[top]
+
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(query)
+        scored = []
+        removed = self.index.removed
+        for row in rows.tolist():
+            if row in removed:
+                continue
+            matcher.set_seq1(self.index.norm_names[row])
+            if matcher.real_quick_ratio() < cutoff or matcher.quick_ratio() < cutoff:
+                continue
+            score = matcher.ratio()
+            if score >= cutoff:
+                scored.append((score, -row))
+
+        return [-neg_row for _, neg_row in heapq.nlargest(n, scored)]
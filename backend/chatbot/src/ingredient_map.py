@@ -0,0 +1,274 @@
+"""Per-store tables from canonical ingredient names to SKU rows.
+
+Every ingredient in the recipe dataset is cleaned once (measures and
+descriptors stripped, see ingredient_names) and each distinct canonical
+name is resolved against a store the way a quick inventory check would:
+the exact row, else up to 3 rows containing the name, else up to 3 fuzzy
+matches. A dish availability check then costs one dict probe per
+ingredient. Stock levels are read live from the store, so only adds and
+removals touch the table, and those re-resolve just the names they can
+affect.
+
+When SAM_SNAPSHOT_DIR is set, tables are saved next to the inventory
+snapshots and reused by every worker until the store's CSV changes.
+Build one offline with:
+
+    python -m chatbot.src.ingredient_map <inventory csv or url> [recipes csv]
+"""
+
+import difflib
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+
+from .ingredient_names import clean_ingredient_names
+from .inventory_cache import get_store_inventory, inventory_cache
+from .inventory_snapshot import SNAPSHOT_DIR
+from .product_index import normalize_name
+from .product_search import CANDIDATE_CUTOFF, candidate_rows
+from .recipe_store import RecipeStore
+from .utils import recipes_csv_path
+
+INGREDIENT_MAP_SUFFIX = ".ingredients.json"
+
+
+def ingredient_map_path_for(csv_url, names_hash, snapshot_dir=None):
+    """Return where the table of a store CSV lives, or None if snapshots are disabled."""
+    snapshot_dir = snapshot_dir or SNAPSHOT_DIR
+    if not snapshot_dir:
+        return None
+    key = hashlib.sha256(csv_url.encode("utf-8")).hexdigest()[:32]
+    return os.path.join(snapshot_dir, f"{key}-{names_hash}{INGREDIENT_MAP_SUFFIX}")
+
+
+def _resolve(store, name):
+    """Return the candidate rows of a name and how they were matched."""
+    rows, exact = candidate_rows(store, name)
+    if exact:
+        return rows, "exact"
+    if rows and normalize_name(name) in store.index.norm_names[rows[0]]:
+        return rows, "substring"
+    return rows, "fuzzy"
+
+
+class IngredientSkuMap:
+    """Canonical ingredient name -> candidate SKU rows for one store.
+
+    ``entries`` maps each name to its rows and to how they were matched
+    ("exact", "substring" or "fuzzy"). ``sync`` catches up with the
+    store's deltas: names whose rows were removed, names contained in an
+    added product and fuzzy names close to one are resolved again; every
+    other entry is still what a fresh lookup would return. ``generation``
+    goes up whenever the table or the store's row count changes.
+    """
+
+    def __init__(self, store, canonical, entries=None, rows_seen=None, version=0):
+        self.store = store
+        self.canonical = canonical
+        if entries is None:
+            names = dict.fromkeys(name for name in canonical.values() if name)
+            entries = {name: _resolve(store, name) for name in names}
+        self.entries = entries
+        self.rows_seen = len(store.index.norm_names) if rows_seen is None else rows_seen
+        self.removed = set() if version == 0 else set(store.index.removed)
+        self.version = version
+        self.generation = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def canonical_names(self, ingredients):
+        """Clean ingredient names, by dict probe for those in the recipe vocabulary."""
+        names = [self.canonical.get(ingredient) for ingredient in ingredients]
+        missing = [i for i, name in enumerate(names) if name is None]
+        if missing:
+            cleaned = clean_ingredient_names([ingredients[i] for i in missing])
+            for i, name in zip(missing, cleaned):
+                names[i] = name
+        return names
+
+    def candidate_rows(self, name):
+        """Return the rows a canonical name refers to, and whether the match is exact."""
+        self.sync()
+        entry = self.entries.get(name)
+        if entry is None:
+            # Not a recipe ingredient (e.g. from the online fallback)
+            return candidate_rows(self.store, name)
+        rows, kind = entry
+        return rows, kind == "exact"
+
+    def sync(self):
+        """Re-resolve the names affected by deltas applied since the last sync."""
+        if self.version == self.store.version:
+            return
+        with self._lock:
+            store = self.store
+            version = store.version
+            if self.version == version:
+                return
+            index = store.state.index
+            removed = index.removed - self.removed
+            added = index.norm_names[self.rows_seen :]
+
+            stale = set()
+            if removed:
+                stale.update(
+                    name
+                    for name, (rows, _) in self.entries.items()
+                    if not removed.isdisjoint(rows)
+                )
+            queries = []
+            if added:
+                queries = [
+                    (name, normalize_name(name), kind)
+                    for name, (_, kind) in self.entries.items()
+                ]
+            matcher = difflib.SequenceMatcher()
+            for added_name in added:
+                matcher.set_seq1(added_name)
+                for name, query, kind in queries:
+                    if query in added_name:
+                        stale.add(name)
+                    elif kind == "fuzzy":
+                        matcher.set_seq2(query)
+                        if (
+                            matcher.real_quick_ratio() >= CANDIDATE_CUTOFF
+                            and matcher.quick_ratio() >= CANDIDATE_CUTOFF
+                            and matcher.ratio() >= CANDIDATE_CUTOFF
+                        ):
+                            stale.add(name)
+
+            for name in stale:
+                self.entries[name] = _resolve(store, name)
+            if stale or added:
+                self.generation += 1
+            self.rows_seen = len(index.norm_names)
+            self.removed = set(index.removed)
+            self.version = version
+
+    def memory_usage(self):
+        """Approximate bytes held by the table, not counting the shared canonical names."""
+        return (
+            sys.getsizeof(self.entries)
+            + sum(
+                sys.getsizeof(name)
+                + sys.getsizeof(entry)
+                + sys.getsizeof(entry[0])
+                + sum(sys.getsizeof(row) for row in entry[0])
+                for name, entry in self.entries.items()
+            )
+            + sys.getsizeof(self.removed)
+        )
+
+    def save(self, path, names_hash):
+        """Write the table as built for the store's CSV, replacing the file atomically."""
+        data = {
+            "content_hash": self.store.content_hash,
+            "names_hash": names_hash,
+            "rows": self.rows_seen,
+            "entries": {name: [kind, rows] for name, (rows, kind) in self.entries.items()},
+        }
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path, store, canonical, names_hash):
+        """Read a saved table for this load of the store, or return None if it is stale."""
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data["content_hash"] != store.content_hash or data["names_hash"] != names_hash:
+            return None
+        entries = {name: (rows, kind) for name, (kind, rows) in data["entries"].items()}
+        # The file describes the store as loaded; deltas since are replayed by sync
+        return cls(store, canonical, entries, rows_seen=data["rows"])
+
+
+class IngredientSkuMaps:
+    """The IngredientSkuMap of every store, over one recipe ingredient vocabulary.
+
+    A table lives as long as its store stays in the inventory cache, and
+    its size counts towards the cache's memory budget.
+    """
+
+    def __init__(self, ingredients):
+        ingredients = list(ingredients)
+        self.canonical = dict(zip(ingredients, clean_ingredient_names(ingredients)))
+        names = sorted({name for name in self.canonical.values() if name})
+        self.names_hash = hashlib.sha256("\n".join(names).encode("utf-8")).hexdigest()[:16]
+        self._maps = {}
+        self._lock = threading.Lock()
+        inventory_cache.add_eviction_listener(self._drop)
+
+    def _drop(self, csv_url, store):
+        with self._lock:
+            sku_map = self._maps.get(csv_url)
+            if sku_map is not None and sku_map.store is store:
+                del self._maps[csv_url]
+
+    def _load_or_build(self, csv_url, store):
+        path = ingredient_map_path_for(csv_url, self.names_hash)
+        if path is not None and os.path.exists(path):
+            try:
+                sku_map = IngredientSkuMap.load(path, store, self.canonical, self.names_hash)
+                if sku_map is not None:
+                    return sku_map
+            except Exception as e:
+                print(f"Ignoring unreadable ingredient map {path}: {e}")
+
+        sku_map = IngredientSkuMap(store, self.canonical, version=store.version)
+        # A table built after deltas matches the current rows, not the CSV
+        if path is not None and store.version == 0:
+            try:
+                sku_map.save(path, self.names_hash)
+            except Exception as e:
+                print(f"Could not write ingredient map {path}: {e}")
+        return sku_map
+
+    def get(self, csv_url):
+        """Return the up-to-date table for a store, loading or building it on first use."""
+        store = get_store_inventory(csv_url)
+        built = False
+        with self._lock:
+            sku_map = self._maps.get(csv_url)
+            if sku_map is None or sku_map.store is not store:
+                # First use, or the store was reloaded from a changed CSV
+                sku_map = self._load_or_build(csv_url, store)
+                self._maps[csv_url] = sku_map
+                built = True
+        # Outside self._lock: going over the budget evicts stores, which calls _drop
+        if built and not inventory_cache.add_footprint(csv_url, store, sku_map.memory_usage()):
+            # The store left the cache while the table was being built
+            self._drop(csv_url, store)
+        sku_map.sync()
+        return sku_map
+
+
+def compile_ingredient_map(csv_url, recipes_path=None):
+    """Build and save the table of a store CSV; returns the output path."""
+    recipes = RecipeStore.load(recipes_path or recipes_csv_path)
+    maps = IngredientSkuMaps(recipes.vocab)
+    path = ingredient_map_path_for(csv_url, maps.names_hash)
+    if path is None:
+        raise ValueError("SAM_SNAPSHOT_DIR is not set")
+    maps.get(csv_url)
+    return path
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        print(__doc__)
+        sys.exit(1)
+    output = compile_ingredient_map(sys.argv[1], sys.argv[2] if len(sys.argv) == 3 else None)
+    print(f"Wrote {output}")
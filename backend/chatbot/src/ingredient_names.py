@@ -0,0 +1,56 @@
+import re
+
+import pandas as pd
+
+# Leading quantities such as "1 cup", "2 1/2 tbsp" or "500 g"
+MEASUREMENT_PATTERN = re.compile(
+    r"^\d+[\d\s/]*\s*(cup|cups|tbsp|tsp|tablespoon|tablespoons|teaspoon|teaspoons|lb|lbs|oz|ounce|ounces|pound|pounds|g|grams|kg|kilogram|kilograms|ml|liter|liters)\b\s*",
+    flags=re.IGNORECASE,
+)
+
+# Common adjectives and descriptors that do not help an inventory search
+DESCRIPTOR_WORDS = [
+    "fresh",
+    "dried",
+    "chopped",
+    "diced",
+    "sliced",
+    "minced",
+    "ground",
+    "whole",
+    "large",
+    "small",
+    "medium",
+    "organic",
+    "extra",
+    "virgin",
+    "all-purpose",
+    "unsalted",
+    "boneless",
+    "skinless",
+]
+DESCRIPTOR_PATTERN = re.compile(
+    r"\b(?:" + "|".join(re.escape(word) for word in DESCRIPTOR_WORDS) + r")\b",
+    flags=re.IGNORECASE,
+)
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def clean_ingredient_name(ingredient):
+    """Clean ingredient name to make it suitable for inventory search."""
+    ingredient = MEASUREMENT_PATTERN.sub("", ingredient)
+    ingredient = DESCRIPTOR_PATTERN.sub("", ingredient)
+    ingredient = WHITESPACE_PATTERN.sub(" ", ingredient).strip()
+
+    # Take the first 1-2 words as the main ingredient
+    return " ".join(ingredient.split()[:2])
+
+
+def clean_ingredient_names(ingredients):
+    """Clean a whole list of ingredient names at once; same rules as clean_ingredient_name."""
+    if not len(ingredients):
+        return []
+    names = pd.Series(list(ingredients), dtype=object).fillna("").astype(str)
+    names = names.str.replace(MEASUREMENT_PATTERN, "", regex=True)
+    names = names.str.replace(DESCRIPTOR_PATTERN, "", regex=True)
+    return names.str.split().str[:2].str.join(" ").tolist()
@@ -0,0 +1,115 @@
+import copy
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from .llm_utils import extract_intent, extract_intent_async
+
+INTENT_CACHE_SIZE = int(os.getenv("SAM_INTENT_CACHE_SIZE", "4096"))
+INTENT_CACHE_TTL_SECONDS = float(os.getenv("SAM_INTENT_CACHE_TTL_SECONDS", "3600"))
+
+PUNCTUATION_PATTERN = re.compile(r"[^\w\s]")
+# Endings that look plural but aren't, e.g. "glass", "hummus", "tennis"
+_NOT_PLURAL_ENDINGS = ("ss", "us", "is")
+
+
+def _singular(word):
+    if len(word) <= 3 or not word.endswith("s") or word.endswith(_NOT_PLURAL_ENDINGS):
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("oes", "ses", "xes", "zes", "ches", "shes")):
+        return word[:-2]
+    return word[:-1]
+
+
+def normalize_query(query):
+    """Fold a query to its cache key: lowercase, no punctuation, single spaces, singular words."""
+    query = PUNCTUATION_PATTERN.sub("", str(query).lower())
+    return " ".join(_singular(word) for word in query.split())
+
+
+class IntentCache:
+    """Bounded LRU cache of parsed intents, keyed by the normalized query.
+
+    Entries expire ``ttl`` seconds after they were stored. Only real
+    classifications are kept; the "unknown" fallback returned when the LLM
+    call fails is never cached, so the next ask retries the LLM.
+    """
+
+    def __init__(self, max_entries=INTENT_CACHE_SIZE, ttl=INTENT_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, query):
+        """Return a copy of the cached intent for a query, or None."""
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(entry[0])
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, query, parsed):
+        """Store the parsed intent for a query, evicting the least recently used entry."""
+        if not isinstance(parsed, dict) or parsed.get("intent", "unknown") == "unknown":
+            return
+        key = normalize_query(query)
+        with self._lock:
+            self._entries[key] = (copy.deepcopy(parsed), time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return hit/miss counters and the current size of the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+intent_cache = IntentCache()
+
+
+def extract_intent_cached(query):
+    """extract_intent with repeated queries answered from the intent cache."""
+    parsed = intent_cache.get(query)
+    if parsed is None:
+        parsed = extract_intent(query)
+        intent_cache.put(query, parsed)
+    return parsed
+
+
+async def extract_intent_cached_async(query):
+    """extract_intent_async with repeated queries answered from the intent cache."""
+    parsed = intent_cache.get(query)
+    if parsed is None:
+        parsed = await extract_intent_async(query)
+        intent_cache.put(query, parsed)
+    return parsed
+
+
+def intent_cache_stats():
+    """Return hit/miss counters and the size of the intent cache."""
+    return intent_cache.stats()
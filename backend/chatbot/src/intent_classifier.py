@@ -0,0 +1,454 @@
+"""Rule-based intent classifier that answers common queries without the LLM.
+
+Each rule is a regular expression for one intent with a fixed confidence.
+The first rule that matches wins; queries no rule covers confidently
+enough go to the LLM as before.
+
+Report the bypass rate and accuracy on the prompt's examples, a set of
+typical queries and held-out queries written after the rules (optionally
+plus logged traffic, one JSON object with
+"query", "intent" and "product" per line) with:
+
+    python -m chatbot.src.intent_classifier [logged_queries.jsonl]
+"""
+
+import json
+import os
+import re
+import sys
+import time
+
+from .conversational_handler import (
+    contains_inappropriate_language,
+    is_farewell,
+    is_greeting,
+    is_personal_question,
+    is_shopping_related,
+    is_thank_you,
+)
+from .intent_cache import extract_intent_cached_async
+from .llm_utils import INTENT_EXAMPLES
+from .search_service import run_search
+
+# Local answers below this confidence are sent to the LLM instead
+INTENT_CONFIDENCE_THRESHOLD = float(os.getenv("SAM_INTENT_CONFIDENCE_THRESHOLD", "0.8"))
+
+_ARTICLE = r"(?:(?:a|an|the|some|any|my) )?"
+
+CATEGORY_LIST_PATTERNS = [
+    re.compile(
+        r"^(?:what|which|show|list|see|tell me)\b.*\b(?:categories|sections|departments"
+        r"|aisles|(?:types?|kinds?) of (?:products|items|things))\b"
+    ),
+]
+
+RECIPE_PATTERNS = [
+    re.compile(
+        r"^(?:what|which) (?:can|could|should) i (?:make|cook|prepare|bake) "
+        r"(?:with|using|from) (?P<product>.+)$"
+    ),
+    re.compile(
+        r"^(?:i need |i want |give me |find me |show me |suggest |any )?"
+        r"(?:a |some )?recipes? (?:for|using|with|that uses?) (?P<product>.+)$"
+    ),
+]
+
+DISH_INGREDIENTS_PATTERNS = [
+    re.compile(
+        r"^(?:what|which) (?:do|would|will) i need (?:for|to make|to cook|to bake) "
+        + _ARTICLE
+        + r"(?P<product>.+)$"
+    ),
+    re.compile(
+        r"^(?:i need |what are )?(?:the )?ingredients? (?:for|of|in|needed for|to make) "
+        + _ARTICLE
+        + r"(?P<product>.+)$"
+    ),
+    re.compile(
+        r"^i(?: want| would like| wanna|'d like) to (?:make|cook|eat|bake|prepare) "
+        + _ARTICLE
+        + r"(?P<product>.+)$"
+    ),
+    re.compile(r"^how (?:do i|to|can i) (?:make|cook|bake|prepare) " + _ARTICLE + r"(?P<product>.+)$"),
+]
+
+SUSTAINABILITY_PATTERNS = [
+    re.compile(
+        r"\b(?:eco[- ]?friendly|sustainable|green|environment(?:ally)? friendly|reusable)"
+        r" (?:alternatives?|options?|versions?|substitutes?|replacements?) (?:to|for|of) "
+        + _ARTICLE
+        + r"(?P<product>.+)$"
+    ),
+]
+
+SUGGESTION_PATTERNS = [
+    re.compile(
+        r"^(?:can you |could you |please )?(?:suggest|recommend)\b"
+        r"(?! (?:a |some )?recipes?\b).*$"
+    ),
+    re.compile(r"^what should i (?:buy|get|bring)\b.*$"),
+]
+
+SEARCH_PATTERN = re.compile(
+    r"^(?P<lead>do you (?:have|sell|stock|carry)|have you got|got|is there|are there"
+    r"|where (?:is|are|can i find|do you keep)|i need|i want|(?:i'm |im |i am )?looking for"
+    r"|show me|find(?: me)?|can i get|i'd like|get me)"
+    r"(?: to (?:buy|get|find|pick up))? "
+    + _ARTICLE
+    + r"(?P<product>.+?)(?: (?:in stock|here|today|please|for me|available))*$"
+)
+# Leads that almost always mean a specific product rather than a browse
+STRONG_SEARCH_LEADS = {
+    "do you have", "do you sell", "do you stock", "do you carry",
+    "where is", "where are", "where can i find",
+}
+# Leads that just as often ask for a service or a place ("show me the money",
+# "is there a pharmacy nearby"); they only bypass the LLM for a capture that
+# names a known product
+WEAK_SEARCH_LEADS = {"i want", "show me", "find", "find me", "is there", "are there"}
+
+# Phrases that name a whole section of the store rather than a product
+CATEGORY_HEADS = {"items", "products", "stuff", "supplies", "essentials", "things", "goods"}
+CATEGORY_NAMES = {
+    "snacks", "munchies", "fruits", "vegetables", "fruits and vegetables", "produce",
+    "beverages", "drinks", "dairy", "spices", "desserts", "biscuits", "chocolates",
+    "candies", "meats", "seafood", "personal care", "household", "cleaning", "hygiene",
+    "packaged food", "groceries",
+}
+
+# Words that mean a "product" phrase is really a question the rules don't
+# understand (prices, recipes, vague requests), so the LLM should decide
+UNCLEAR_WORDS = {
+    "to", "for", "on", "under", "over", "with", "without", "than", "like", "something",
+    "anything", "help", "recipe", "recipes", "ingredients", "sale", "offer", "offers",
+    "discount", "price", "cheap", "cheaper", "what", "which", "me", "it", "this", "that",
+}
+
+# Words that make a search capture a question about the store or the
+# assistant rather than a product ("where is my order", "do you have time")
+SERVICE_WORDS = {
+    "order", "orders", "refund", "refunds", "return", "returns", "exchange", "delivery",
+    "time", "hours", "open", "closed", "located", "location", "address", "nearby",
+    "restroom", "restrooms", "toilet", "toilets", "bathroom", "washroom", "parking",
+    "exit", "entrance", "manager", "staff", "cashier", "checkout", "counter", "job",
+    "jobs", "money", "store", "shop", "branch", "receipt", "bill", "wifi", "atm",
+}
+PRONOUNS = {"you", "your", "yours", "i", "me", "my", "we", "us", "our", "he", "she", "they", "them"}
+
+# Dishes and ingredients the recipe rules may answer for without the LLM.
+# A recipe or dish capture outside these (e.g. "birthday party", "money")
+# is only a guess, so it stays below the bypass threshold.
+KNOWN_DISHES = {
+    "biryani", "bread", "brownie", "burger", "cake", "casserole", "chili", "chowmein",
+    "cookie", "cupcake", "curry", "dal", "dosa", "fried rice", "fish and chips", "idli",
+    "khichdi", "lasagna", "mac and cheese", "masala", "muffin", "noodle", "omelette",
+    "pancake", "paratha", "pasta", "pie", "pizza", "pulao", "ramen", "risotto", "roti",
+    "salad", "sandwich", "smoothie", "soup", "spaghetti", "stew", "stir fry", "sushi",
+    "taco", "tikka", "upma", "waffle",
+}
+KNOWN_INGREDIENTS = {
+    "apple", "avocado", "bacon", "banana", "basil", "bean", "beef", "bread", "broccoli",
+    "butter", "cabbage", "carrot", "cauliflower", "cheese", "chicken", "chickpea",
+    "chili", "chocolate", "coconut", "corn", "cream", "cucumber", "egg", "fish", "flour",
+    "garlic", "ginger", "honey", "lamb", "lemon", "lentil", "milk", "mushroom",
+    "mutton", "noodle", "oat", "onion", "paneer", "pasta", "pea", "peanut", "pepper",
+    "pork", "potato", "prawn", "rice", "salmon", "shrimp", "spinach", "sugar", "tofu",
+    "tomato", "tuna", "yogurt",
+}
+
+PRODUCT_SPLIT_PATTERN = re.compile(r"\s*(?:,|&|\band\b)\s*")
+LEADING_ARTICLE_PATTERN = re.compile(r"^(?:a|an|the|some|any)\s+")
+
+# Typical shopper queries labelled like the LLM labels them, used alongside
+# INTENT_EXAMPLES when benchmarking
+BENCHMARK_QUERIES = [
+    ("do you have milk", {"intent": "product_search", "product": "milk", "filter": ""}),
+    ("Do you have eggs?", {"intent": "product_search", "product": "eggs", "filter": ""}),
+    ("where is the bread", {"intent": "product_search", "product": "bread", "filter": ""}),
+    ("Where can I find olive oil?", {"intent": "product_search", "product": "olive oil", "filter": ""}),
+    ("do you sell tata salt", {"intent": "product_search", "product": "tata salt", "filter": ""}),
+    ("I need butter and cheese", {"intent": "product_search", "product": ["butter", "cheese"], "filter": ""}),
+    ("looking for basmati rice", {"intent": "product_search", "product": "basmati rice", "filter": ""}),
+    ("Do you have tomatoes, onions and garlic?", {"intent": "product_search", "product": ["tomatoes", "onions", "garlic"], "filter": ""}),
+    ("is there any paneer in stock", {"intent": "product_search", "product": "paneer", "filter": ""}),
+    ("got any maggi", {"intent": "product_search", "product": "maggi", "filter": ""}),
+    ("show me beverages", {"intent": "category_search", "product": "beverages", "filter": ""}),
+    ("I need personal care items", {"intent": "category_search", "product": "personal care items", "filter": ""}),
+    ("looking for dairy products", {"intent": "category_search", "product": "dairy products", "filter": ""}),
+    ("show me all categories", {"intent": "category_list", "product": "", "filter": ""}),
+    ("What type of products do you have?", {"intent": "category_list", "product": "", "filter": ""}),
+    ("which aisles are there", {"intent": "category_list", "product": "", "filter": ""}),
+    ("ingredients for pasta", {"intent": "dish_ingredients", "product": "pasta", "filter": ""}),
+    ("what do I need to make biryani", {"intent": "dish_ingredients", "product": "biryani", "filter": ""}),
+    ("I want to cook ramen", {"intent": "dish_ingredients", "product": "ramen", "filter": ""}),
+    ("how do I make pancakes", {"intent": "dish_ingredients", "product": "pancakes", "filter": ""}),
+    ("what can I cook with potatoes and eggs", {"intent": "recipe", "product": ["potatoes", "eggs"], "filter": ""}),
+    ("recipes with chicken", {"intent": "recipe", "product": "chicken", "filter": ""}),
+    ("give me a recipe using spinach and paneer", {"intent": "recipe", "product": ["spinach", "paneer"], "filter": ""}),
+    ("suggest something for a party", {"intent": "suggestion", "product": "", "filter": ""}),
+    ("what should I buy for diwali", {"intent": "suggestion", "product": "", "filter": ""}),
+    ("recommend some snacks for movie night", {"intent": "suggestion", "product": "", "filter": ""}),
+    ("eco-friendly alternative to plastic bags", {"intent": "sustainability", "product": "plastic bags", "filter": "eco-friendly"}),
+    ("any sustainable options for detergent", {"intent": "sustainability", "product": "detergent", "filter": "eco-friendly"}),
+    ("hey", {"intent": "greeting", "product": "", "filter": ""}),
+    ("good morning", {"intent": "greeting", "product": "", "filter": ""}),
+    ("bye", {"intent": "farewell", "product": "", "filter": ""}),
+    ("thanks a lot", {"intent": "thank_you", "product": "", "filter": ""}),
+    ("what can you do", {"intent": "personal", "product": "", "filter": ""}),
+    ("milk", {"intent": "product_search", "product": "milk", "filter": ""}),
+    ("tell me a joke", {"intent": "conversational", "product": "", "filter": ""}),
+    ("is it going to rain today", {"intent": "conversational", "product": "", "filter": ""}),
+]
+
+# Held-out queries written after the rules, labelled as the LLM would label
+# them; most look like a recipe, dish or product question but are not one
+# the rules should answer
+HELD_OUT_QUERIES = [
+    ("where are you located", {"intent": "conversational", "product": "", "filter": ""}),
+    ("where is my order", {"intent": "conversational", "product": "", "filter": ""}),
+    ("do you have time", {"intent": "conversational", "product": "", "filter": ""}),
+    ("I want a refund", {"intent": "conversational", "product": "", "filter": ""}),
+    ("is there a pharmacy nearby", {"intent": "conversational", "product": "", "filter": ""}),
+    ("find me a job", {"intent": "conversational", "product": "", "filter": ""}),
+    ("show me the money", {"intent": "conversational", "product": "", "filter": ""}),
+    ("where is the restroom", {"intent": "conversational", "product": "", "filter": ""}),
+    ("is there parking", {"intent": "conversational", "product": "", "filter": ""}),
+    ("I want a new phone", {"intent": "conversational", "product": "", "filter": ""}),
+    ("I want some apples", {"intent": "product_search", "product": "apples", "filter": ""}),
+    ("where are the onions", {"intent": "product_search", "product": "onions", "filter": ""}),
+    ("what do I need for a birthday party", {"intent": "suggestion", "product": "", "filter": ""}),
+    ("how to make money", {"intent": "conversational", "product": "", "filter": ""}),
+    ("I want to eat something healthy", {"intent": "suggestion", "product": "", "filter": ""}),
+    ("I want to make a cake and cookies", {"intent": "dish_ingredients", "product": ["cake", "cookies"], "filter": ""}),
+    ("how do I make friends", {"intent": "conversational", "product": "", "filter": ""}),
+    ("what can I make with leftovers", {"intent": "recipe", "product": "leftovers", "filter": ""}),
+    ("recipe for disaster", {"intent": "conversational", "product": "", "filter": ""}),
+    ("I'd like to make a reservation", {"intent": "conversational", "product": "", "filter": ""}),
+    ("ingredients for mac and cheese", {"intent": "dish_ingredients", "product": "mac and cheese", "filter": ""}),
+    ("what can I cook with chicken and rice", {"intent": "recipe", "product": ["chicken", "rice"], "filter": ""}),
+    ("how do I make a chocolate cake", {"intent": "dish_ingredients", "product": "chocolate cake", "filter": ""}),
+]
+
+_stats = {"local": 0, "llm": 0}
+
+
+def _normalize(query):
+    query = re.sub(r"[?!.]+", " ", str(query).lower())
+    return " ".join(query.split())
+
+
+def _split_products(text):
+    """Split 'a, b and c' into its items; a single item stays a string."""
+    items = [LEADING_ARTICLE_PATTERN.sub("", item) for item in PRODUCT_SPLIT_PATTERN.split(text)]
+    items = [item for item in items if item]
+    if len(items) == 1:
+        return items[0]
+    return items
+
+
+def _singular(word):
+    for suffix, replacement in (("ies", "y"), ("oes", "o"), ("es", "e"), ("s", "")):
+        if word.endswith(suffix) and len(word) > len(suffix) + 1:
+            return word[: -len(suffix)] + replacement
+    return word
+
+
+def _is_known(item, known):
+    """Return whether a captured item, or its last word, names something in known."""
+    words = [_singular(word) for word in item.split()]
+    if not words:
+        return False
+    return " ".join(words) in known or words[-1] in known
+
+
+def _is_category(product):
+    words = product.split()
+    return product in CATEGORY_NAMES or (len(words) > 1 and words[-1] in CATEGORY_HEADS)
+
+
+def _is_clear_product(product):
+    words = " ".join(product if isinstance(product, list) else [product]).split()
+    if len(words) == 1 and words[0] in CATEGORY_HEADS:
+        return False
+    return bool(words) and not any(
+        word in UNCLEAR_WORDS or any(ch.isdigit() for ch in word) for word in words
+    )
+
+
+def _is_service_request(product):
+    items = product if isinstance(product, list) else [product]
+    words = " ".join(items).split()
+    return (
+        any(item.split()[0] in PRONOUNS for item in items if item.split())
+        or any(word in SERVICE_WORDS for word in words)
+    )
+
+
+def _result(intent, product="", filter_val=""):
+    return {"intent": intent, "product": product, "filter": filter_val}
+
+
+def classify_intent(query):
+    """Classify a query locally. Returns (parsed intent or None, confidence)."""
+    text = _normalize(query)
+    if not text:
+        return None, 0.0
+
+    if contains_inappropriate_language(text):
+        return _result("inappropriate"), 0.9
+
+    for pattern in CATEGORY_LIST_PATTERNS:
+        if pattern.search(text):
+            return _result("category_list"), 0.95
+
+    for pattern in RECIPE_PATTERNS:
+        match = pattern.match(text)
+        if match:
+            product = _split_products(match.group("product"))
+            if not _is_clear_product(product):
+                return None, 0.0
+            items = product if isinstance(product, list) else [product]
+            known = all(_is_known(item, KNOWN_INGREDIENTS) for item in items)
+            return _result("recipe", product), 0.9 if known else 0.7
+
+    for pattern in DISH_INGREDIENTS_PATTERNS:
+        match = pattern.match(text)
+        if match:
+            dish = match.group("product")
+            # "mac and cheese" is one dish; otherwise "x and y" is several
+            product = dish if _is_known(dish, KNOWN_DISHES) else _split_products(dish)
+            if not _is_clear_product(product):
+                return None, 0.0
+            # One dish per question is what the dish handler answers
+            known = isinstance(product, str) and _is_known(product, KNOWN_DISHES)
+            return _result("dish_ingredients", product), 0.9 if known else 0.7
+
+    for pattern in SUSTAINABILITY_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            return _result("sustainability", match.group("product"), "eco-friendly"), 0.85
+
+    for pattern in SUGGESTION_PATTERNS:
+        if pattern.match(text):
+            return _result("suggestion"), 0.85
+
+    match = SEARCH_PATTERN.match(text)
+    if match:
+        product = _split_products(match.group("product"))
+        if not _is_clear_product(product) or _is_service_request(product):
+            return None, 0.0
+        if isinstance(product, str) and _is_category(product):
+            return _result("category_search", product), 0.85
+        lead = match.group("lead")
+        if lead in WEAK_SEARCH_LEADS:
+            items = product if isinstance(product, list) else [product]
+            known = all(_is_known(item, KNOWN_INGREDIENTS | KNOWN_DISHES) for item in items)
+            return _result("product_search", product), 0.8 if known else 0.7
+        confidence = 0.9 if lead in STRONG_SEARCH_LEADS else 0.8
+        return _result("product_search", product), confidence
+
+    # Small talk only counts when nothing in it looks like shopping
+    if len(text.split()) <= 5 and not is_shopping_related(text):
+        if is_thank_you(text):
+            return _result("thank_you"), 0.9
+        if is_farewell(text):
+            return _result("farewell"), 0.9
+        if is_greeting(text):
+            return _result("greeting"), 0.9
+        if is_personal_question(text):
+            return _result("personal"), 0.85
+
+    return None, 0.0
+
+
+async def resolve_intent_async(query, threshold=None):
+    """Return the parsed intent, from the local classifier when it is confident enough.
+
+    Otherwise falls back to the (cached) LLM extraction.
+    """
+    threshold = INTENT_CONFIDENCE_THRESHOLD if threshold is None else threshold
+    parsed, confidence = await run_search(classify_intent, query)
+    if parsed is not None and confidence >= threshold:
+        _stats["local"] += 1
+        return parsed
+    _stats["llm"] += 1
+    return await extract_intent_cached_async(query)
+
+
+def intent_classifier_stats():
+    """Return how many queries were answered locally and how many went to the LLM."""
+    total = _stats["local"] + _stats["llm"]
+    return {
+        **_stats,
+        "bypass_rate": _stats["local"] / total if total else 0.0,
+    }
+
+
+def _same_product(a, b):
+    def fold(value):
+        if isinstance(value, list):
+            return sorted(str(item).strip().lower() for item in value)
+        return str(value).strip().lower()
+
+    return fold(a) == fold(b)
+
+
+def benchmark(samples=None, threshold=None):
+    """Measure bypass rate and accuracy of the local classifier on labelled samples.
+
+    ``samples`` is a list of (query, expected) pairs and defaults to the
+    prompt's examples, BENCHMARK_QUERIES and HELD_OUT_QUERIES. A bypassed query counts as
+    correct when both its intent and its product match the label.
+    """
+    threshold = INTENT_CONFIDENCE_THRESHOLD if threshold is None else threshold
+    if samples is None:
+        samples = INTENT_EXAMPLES + BENCHMARK_QUERIES + HELD_OUT_QUERIES
+    bypassed = 0
+    correct = 0
+    intent_correct = 0
+    misses = []
+    start = time.perf_counter()
+    for query, expected in samples:
+        parsed, confidence = classify_intent(query)
+        if parsed is None or confidence < threshold:
+            continue
+        bypassed += 1
+        if parsed["intent"] == expected.get("intent"):
+            intent_correct += 1
+            if _same_product(parsed["product"], expected.get("product", "")):
+                correct += 1
+                continue
+        misses.append((query, parsed, expected))
+    elapsed = time.perf_counter() - start
+    return {
+        "samples": len(samples),
+        "bypassed": bypassed,
+        "bypass_rate": bypassed / len(samples) if samples else 0.0,
+        "accuracy": correct / bypassed if bypassed else 0.0,
+        "intent_accuracy": intent_correct / bypassed if bypassed else 0.0,
+        "us_per_query": elapsed / len(samples) * 1e6 if samples else 0.0,
+        "misses": misses,
+    }
+
+
+def _load_samples(path):
+    samples = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                samples.append((record.pop("query"), record))
+    return samples
+
+
+if __name__ == "__main__":
+    samples = INTENT_EXAMPLES + BENCHMARK_QUERIES + HELD_OUT_QUERIES
+    if len(sys.argv) > 1:
+        samples = samples + _load_samples(sys.argv[1])
+    report = benchmark(samples)
+    print(f"Samples:         {report['samples']}")
+    print(f"Bypass rate:     {report['bypass_rate']:.1%} ({report['bypassed']} answered locally)")
+    print(f"Accuracy:        {report['accuracy']:.1%} (intent only: {report['intent_accuracy']:.1%})")
+    print(f"Time per query:  {report['us_per_query']:.1f} us")
+    for query, parsed, expected in report["misses"]:
+        print(f"  miss: {query!r} -> {parsed} (expected {expected})")
@@ -0,0 +1,292 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .inventory_fetch import fetch_inventory
+from .inventory_snapshot import load_snapshot_for, save_snapshot_for
+from .store_inventory import StoreInventory, check_deltas
+
+# How long a loaded inventory is trusted before its source is checked again
+INVENTORY_TTL_SECONDS = float(os.getenv("SAM_INVENTORY_TTL_SECONDS", "300"))
+# Memory budget for all cached stores together; 0 means unbounded
+INVENTORY_CACHE_BYTES = int(os.getenv("SAM_INVENTORY_CACHE_BYTES", str(512 * 1024 * 1024)))
+
+
+class _CacheEntry:
+    def __init__(self, store, checked_at, etag=None, last_modified=None):
+        self.store = store
+        self.checked_at = checked_at
+        self.etag = etag
+        self.last_modified = last_modified
+        # Bytes of structures built over the store elsewhere (see add_footprint)
+        self.extra_bytes = 0
+        self.size = store.memory_usage()["total"]
+
+
+class InventoryCache:
+    """Process-wide cache of store inventories and their indexes, keyed by CSV URL.
+
+    An entry is served straight from memory until its TTL runs out. After
+    that the source is revalidated with a conditional request; a 304 keeps
+    the cached store, and a changed body whose content hash matches the
+    cached one still reuses the built indexes. When SAM_SNAPSHOT_DIR is set,
+    a store that is not in memory yet is mapped from its binary snapshot
+    instead of parsed, and every fresh parse refreshes that snapshot for the
+    other workers.
+
+    Entries are kept in least-recently-used order and weighed by their
+    measured footprint (frame plus indexes). Once the total goes over
+    ``max_bytes`` the least recently used stores are evicted; the store
+    just loaded is always kept, even if it alone is over the budget.
+    Structures other modules build per store can be weighed with the store
+    (add_footprint) and dropped when it leaves the cache
+    (add_eviction_listener).
+
+    Stock deltas are logged per store as well as applied, and replayed onto
+    every later load of the same CSV, so they survive eviction and
+    invalidation. A load whose CSV has changed starts a new log. Deltas
+    only live in this process: each API worker keeps the deltas it
+    received itself.
+    """
+
+    def __init__(self, ttl=INVENTORY_TTL_SECONDS, max_bytes=INVENTORY_CACHE_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        # csv_url -> (content_hash of the load, delta batches applied since)
+        self._deltas = {}
+        self._bytes = 0
+        self._eviction_listeners = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _lock_for(self, csv_url):
+        with self._lock:
+            return self._key_locks.setdefault(csv_url, threading.Lock())
+
+    def _is_fresh(self, entry):
+        return entry is not None and time.monotonic() - entry.checked_at < self.ttl
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _touch(self, csv_url):
+        """Return the entry for a store and mark it most recently used."""
+        with self._lock:
+            entry = self._entries.get(csv_url)
+            if entry is not None:
+                self._entries.move_to_end(csv_url)
+            return entry
+
+    def _store_entry(self, csv_url, entry):
+        with self._lock:
+            old = self._entries.pop(csv_url, None)
+            dropped = []
+            if old is not None:
+                self._bytes -= old.size
+                if old.store is not entry.store:
+                    dropped.append((csv_url, old))
+            self._entries[csv_url] = entry
+            self._bytes += entry.size
+            dropped.extend(self._evict())
+        self._notify_dropped(dropped)
+
+    def _evict(self):
+        # Caller holds self._lock and passes the result to _notify_dropped
+        evicted = []
+        if not self.max_bytes:
+            return evicted
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            csv_url, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
+            self.evictions += 1
+            evicted.append((csv_url, entry))
+        return evicted
+
+    def _notify_dropped(self, dropped):
+        # Called without self._lock, so listeners may use the cache
+        for csv_url, entry in dropped:
+            for listener in self._eviction_listeners:
+                listener(csv_url, entry.store)
+
+    def add_eviction_listener(self, listener):
+        """Call listener(csv_url, store) whenever a store leaves the cache.
+
+        That is on eviction, invalidation and replacement by a newer load.
+        """
+        self._eviction_listeners.append(listener)
+
+    def add_footprint(self, csv_url, store, nbytes):
+        """Count nbytes built over a cached store towards its share of the budget.
+
+        Returns False if that store is no longer cached, so the caller can
+        drop what it built instead.
+        """
+        with self._lock:
+            entry = self._entries.get(csv_url)
+            if entry is None or entry.store is not store:
+                return False
+            entry.extra_bytes += nbytes
+            entry.size += nbytes
+            self._bytes += nbytes
+            dropped = self._evict()
+        self._notify_dropped(dropped)
+        return not any(entry.store is store for _, entry in dropped)
+
+    def _replay_deltas(self, csv_url, store):
+        # Caller holds the store's key lock
+        content_hash, batches = self._deltas.get(csv_url, (None, []))
+        if batches and content_hash not in (None, store.content_hash):
+            print(
+                f"Dropping {len(batches)} delta batches for {csv_url}: "
+                "its CSV has changed since they were applied"
+            )
+            batches = []
+        for deltas in batches:
+            store.apply_deltas(deltas)
+        self._deltas[csv_url] = (store.content_hash, batches)
+
+    def get(self, csv_url):
+        """Return the StoreInventory for a store, loading it if needed.
+
+        The returned inventory is shared between all sessions and must only
+        be changed through apply_deltas.
+        """
+        entry = self._touch(csv_url)
+        if self._is_fresh(entry):
+            self._count(hit=True)
+            return entry.store
+
+        # One loader per store; concurrent callers wait for it instead of
+        # fetching the same CSV again.
+        with self._lock_for(csv_url):
+            entry = self._touch(csv_url)
+            if self._is_fresh(entry):
+                self._count(hit=True)
+                return entry.store
+            self._count(hit=False)
+
+            if entry is None:
+                store = load_snapshot_for(csv_url)
+                if store is not None:
+                    self._replay_deltas(csv_url, store)
+                    self._store_entry(csv_url, _CacheEntry(store, time.monotonic()))
+                    return store
+
+            try:
+                if entry is None:
+                    fetched = fetch_inventory(csv_url)
+                else:
+                    fetched = fetch_inventory(csv_url, entry.etag, entry.last_modified)
+            except Exception as e:
+                if entry is None:
+                    raise
+                # Keep serving the last good copy if the source is unreachable
+                print(f"Inventory refresh failed for {csv_url}: {e}")
+                entry.checked_at = time.monotonic()
+                return entry.store
+
+            if entry is not None and (
+                fetched.not_modified
+                or entry.store.content_hash == fetched.content_hash
+            ):
+                entry.checked_at = time.monotonic()
+                entry.etag = fetched.etag
+                entry.last_modified = fetched.last_modified
+                return entry.store
+
+            store = StoreInventory(fetched.frame, fetched.content_hash)
+            save_snapshot_for(csv_url, store)
+            self._replay_deltas(csv_url, store)
+            self._store_entry(
+                csv_url,
+                _CacheEntry(store, time.monotonic(), fetched.etag, fetched.last_modified),
+            )
+            return store
+
+    def apply_deltas(self, csv_url, deltas):
+        """Apply stock deltas to a store and return its new version.
+
+        A store that isn't cached is not loaded for this; the checked
+        deltas are logged and applied when it is next loaded.
+        """
+        with self._lock_for(csv_url):
+            with self._lock:
+                entry = self._entries.get(csv_url)
+            if entry is None:
+                check_deltas(deltas)
+                _, batches = self._deltas.setdefault(csv_url, (None, []))
+                batches.append(list(deltas))
+                return len(batches)
+            store = entry.store
+            version = store.apply_deltas(deltas)
+            self._deltas.setdefault(csv_url, (store.content_hash, []))[1].append(list(deltas))
+        size = store.memory_usage()["total"]
+        dropped = []
+        with self._lock:
+            entry = self._entries.get(csv_url)
+            if entry is not None and entry.store is store:
+                size += entry.extra_bytes
+                self._bytes += size - entry.size
+                entry.size = size
+                dropped = self._evict()
+        self._notify_dropped(dropped)
+        return version
+
+    def invalidate(self, csv_url=None):
+        """Drop one store from the cache, or every store if no URL is given."""
+        with self._lock:
+            if csv_url is None:
+                dropped = list(self._entries.items())
+                self._entries.clear()
+                self._bytes = 0
+            else:
+                entry = self._entries.pop(csv_url, None)
+                dropped = []
+                if entry is not None:
+                    self._bytes -= entry.size
+                    dropped.append((csv_url, entry))
+        self._notify_dropped(dropped)
+
+    def stats(self):
+        """Return the cache counters and its current footprint."""
+        with self._lock:
+            return {
+                "stores": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+inventory_cache = InventoryCache()
+
+
+def get_store_inventory(csv_url):
+    """Return the cached StoreInventory for the given store CSV."""
+    return inventory_cache.get(csv_url)
+
+
+def apply_inventory_deltas(csv_url, deltas):
+    """Apply stock deltas to the cached inventory of the given store CSV."""
+    return inventory_cache.apply_deltas(csv_url, deltas)
+
+
+def get_inventory(csv_url):
+    """Return the cached inventory DataFrame for the given store CSV."""
+    return inventory_cache.get(csv_url).frame
+
+
+def inventory_cache_stats():
+    """Return hit/miss/eviction counters and the footprint of the inventory cache."""
+    return inventory_cache.stats()
@@ -0,0 +1,116 @@
+import hashlib
+import os
+
+import pandas as pd
+import requests
+
+from .store_inventory import compact_inventory_frame, concat_inventory_frames
+
+INVENTORY_FETCH_TIMEOUT = float(os.getenv("SAM_INVENTORY_FETCH_TIMEOUT", "30"))
+# Rows parsed per chunk while a CSV body is being downloaded
+INVENTORY_CHUNK_ROWS = int(os.getenv("SAM_INVENTORY_CHUNK_ROWS", "50000"))
+
+_RAW_DTYPES = {"Category": "category", "location": "category"}
+
+
+class InventoryFetch:
+    """Outcome of fetching a store CSV.
+
+    ``frame`` is None when the source reported it unchanged since the
+    validators that were sent. ``etag`` and ``last_modified`` are the
+    validators to send next time.
+    """
+
+    __slots__ = ("frame", "content_hash", "etag", "last_modified")
+
+    def __init__(self, frame, content_hash, etag=None, last_modified=None):
+        self.frame = frame
+        self.content_hash = content_hash
+        self.etag = etag
+        self.last_modified = last_modified
+
+    @property
+    def not_modified(self):
+        return self.frame is None
+
+
+class _HashingReader:
+    """File-like wrapper that hashes the bytes pandas reads through it."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._hash = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self._stream.read(size if size is not None and size >= 0 else None)
+        self._hash.update(data)
+        return data
+
+    def hexdigest(self):
+        # Drain whatever the parser did not need so the hash covers the body
+        while self.read(1 << 16):
+            pass
+        return self._hash.hexdigest()
+
+
+def parse_inventory_stream(stream, chunk_rows=INVENTORY_CHUNK_ROWS):
+    """Parse a CSV byte stream chunk by chunk into a compact inventory frame.
+
+    Each chunk is compacted as soon as it is read, so the raw object-dtype
+    frame never exists for the whole file. Returns the frame and the
+    sha256 of the bytes read.
+    """
+    reader = _HashingReader(stream)
+    chunks = pd.read_csv(
+        reader, encoding="utf-8-sig", dtype=_RAW_DTYPES, chunksize=chunk_rows
+    )
+    with chunks:
+        frames = [compact_inventory_frame(chunk) for chunk in chunks]
+    return concat_inventory_frames(frames), reader.hexdigest()
+
+
+def _fetch_url(csv_url, etag, last_modified):
+    headers = {"Accept-Encoding": "gzip"}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    with requests.get(
+        csv_url, headers=headers, stream=True, timeout=INVENTORY_FETCH_TIMEOUT
+    ) as response:
+        if response.status_code == 304:
+            return InventoryFetch(None, None, etag, last_modified)
+        response.raise_for_status()
+        # Let urllib3 undo the gzip transfer encoding while we stream
+        response.raw.decode_content = True
+        frame, content_hash = parse_inventory_stream(response.raw)
+        return InventoryFetch(
+            frame,
+            content_hash,
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+        )
+
+
+def _fetch_file(path, etag):
+    # A local file's size and mtime stand in for an ETag
+    stat = os.stat(path)
+    file_etag = f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+    if etag == file_etag:
+        return InventoryFetch(None, None, etag)
+    with open(path, "rb") as f:
+        frame, content_hash = parse_inventory_stream(f)
+    return InventoryFetch(frame, content_hash, file_etag)
+
+
+def fetch_inventory(csv_url, etag=None, last_modified=None):
+    """Fetch and parse a store CSV unless it is unchanged since the given validators.
+
+    Remote CSVs are requested with If-None-Match / If-Modified-Since and
+    gzip accepted; a 304 comes back as an InventoryFetch whose frame is
+    None, without anything being downloaded or parsed.
+    """
+    if csv_url.startswith(("http://", "https://")):
+        return _fetch_url(csv_url, etag, last_modified)
+    return _fetch_file(csv_url, etag)
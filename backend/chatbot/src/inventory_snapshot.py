@@ -0,0 +1,210 @@
+"""Binary inventory snapshots that load through mmap.
+
+A snapshot holds a store's compact inventory frame and its prebuilt name
+index as raw, 64-byte aligned arrays behind a small JSON header. Loading
+one maps the file read-only: the numeric columns, categorical codes and
+posting lists are used straight from the mapping, so several workers on
+one box share the same pages through the OS page cache. Only the string
+tables are decoded into Python objects.
+
+Compile a snapshot offline with:
+
+    python -m chatbot.src.inventory_snapshot <csv path or url> [output path]
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from .fuzzy_match import FuzzyMatcher
+from .inventory_fetch import fetch_inventory
+from .product_index import ProductIndex
+from .store_inventory import StoreInventory
+
+MAGIC = b"SAMSNAP1"
+SNAPSHOT_SUFFIX = ".samsnap"
+SNAPSHOT_DIR = os.getenv("SAM_SNAPSHOT_DIR", "")
+_ALIGN = 64
+
+# Columns stored as codes plus a string table; the rest are stored as raw arrays
+CATEGORY_COLUMNS = ["Category", "name", "location", "name_lower"]
+
+
+def snapshot_path_for(csv_url, snapshot_dir=None):
+    """Return where the snapshot for a store CSV lives, or None if disabled."""
+    snapshot_dir = snapshot_dir or SNAPSHOT_DIR
+    if not snapshot_dir:
+        return None
+    key = hashlib.sha256(csv_url.encode("utf-8")).hexdigest()[:32]
+    return os.path.join(snapshot_dir, key + SNAPSHOT_SUFFIX)
+
+
+def _encode_strings(strings):
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(s) for s in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _decode_strings(blob, offsets):
+    data = blob.tobytes()
+    bounds = offsets.tolist()
+    return [
+        data[bounds[i] : bounds[i + 1]].decode("utf-8")
+        for i in range(len(bounds) - 1)
+    ]
+
+
+def write_snapshot(store, path):
+    """Write a StoreInventory to a snapshot file, replacing it atomically."""
+    frame = store.frame
+    arrays = {}
+    for column in frame.columns:
+        if column in CATEGORY_COLUMNS:
+            values = frame[column].cat
+            arrays[f"{column}.codes"] = np.asarray(values.codes)
+            blob, offsets = _encode_strings(values.categories.tolist())
+            arrays[f"{column}.blob"] = blob
+            arrays[f"{column}.offsets"] = offsets
+        else:
+            arrays[column] = frame[column].to_numpy()
+
+    index = store.index
+    grams_blob, grams_offsets = _encode_strings(list(index.gram_ids))
+    arrays["index.grams.blob"] = grams_blob
+    arrays["index.grams.offsets"] = grams_offsets
+    arrays["index.offsets"] = index.offsets
+    arrays["index.postings"] = index.postings
+    arrays["matcher.lengths"] = store.matcher.lengths
+
+    layout = {}
+    position = 0
+    for name, array in arrays.items():
+        layout[name] = {
+            "offset": position,
+            "dtype": array.dtype.str,
+            "count": int(array.size),
+        }
+        position += -(-array.nbytes // _ALIGN) * _ALIGN
+
+    header = json.dumps(
+        {
+            "rows": len(frame),
+            "columns": list(frame.columns),
+            "content_hash": store.content_hash,
+            "arrays": layout,
+        }
+    ).encode("utf-8")
+    data_start = -(-(len(MAGIC) + 8 + len(header)) // _ALIGN) * _ALIGN
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC)
+            f.write(len(header).to_bytes(8, "little"))
+            f.write(header)
+            for name, array in arrays.items():
+                f.seek(data_start + layout[name]["offset"])
+                f.write(np.ascontiguousarray(array).tobytes())
+            f.truncate(data_start + position)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def load_snapshot(path):
+    """Map a snapshot file and return the StoreInventory it describes."""
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if mapped[: len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not an inventory snapshot")
+    header_len = int.from_bytes(mapped[len(MAGIC) : len(MAGIC) + 8], "little")
+    header_end = len(MAGIC) + 8 + header_len
+    header = json.loads(mapped[len(MAGIC) + 8 : header_end])
+    data_start = -(-header_end // _ALIGN) * _ALIGN
+
+    def array(name):
+        spec = header["arrays"][name]
+        return np.frombuffer(
+            mapped,
+            dtype=np.dtype(spec["dtype"]),
+            count=spec["count"],
+            offset=data_start + spec["offset"],
+        )
+
+    columns = {}
+    for column in header["columns"]:
+        if column in CATEGORY_COLUMNS:
+            categories = _decode_strings(
+                array(f"{column}.blob"), array(f"{column}.offsets")
+            )
+            columns[column] = pd.Categorical.from_codes(
+                array(f"{column}.codes"),
+                dtype=pd.CategoricalDtype(categories),
+                validate=False,
+            )
+        else:
+            columns[column] = array(column)
+    frame = pd.DataFrame(columns, copy=False)
+
+    grams = _decode_strings(array("index.grams.blob"), array("index.grams.offsets"))
+    index = ProductIndex.from_arrays(
+        frame["name_lower"].tolist(),
+        grams,
+        array("index.offsets"),
+        array("index.postings"),
+    )
+    matcher = FuzzyMatcher(index, lengths=array("matcher.lengths"))
+    return StoreInventory.from_parts(frame, index, matcher, header["content_hash"])
+
+
+def load_snapshot_for(csv_url):
+    """Load the snapshot for a store CSV if one exists, otherwise return None."""
+    path = snapshot_path_for(csv_url)
+    if path is None or not os.path.exists(path):
+        return None
+    try:
+        return load_snapshot(path)
+    except Exception as e:
+        print(f"Ignoring unreadable inventory snapshot {path}: {e}")
+        return None
+
+
+def save_snapshot_for(csv_url, store):
+    """Write the snapshot for a freshly parsed store, if snapshots are enabled."""
+    path = snapshot_path_for(csv_url)
+    if path is None:
+        return
+    try:
+        write_snapshot(store, path)
+    except Exception as e:
+        print(f"Could not write inventory snapshot {path}: {e}")
+
+
+def compile_snapshot(csv_url, path=None):
+    """Parse a store CSV and write its snapshot; returns the output path."""
+    fetched = fetch_inventory(csv_url)
+    store = StoreInventory(fetched.frame, fetched.content_hash)
+    path = path or snapshot_path_for(csv_url)
+    if path is None:
+        raise ValueError("No output path given and SAM_SNAPSHOT_DIR is not set")
+    write_snapshot(store, path)
+    return path
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        print(__doc__)
+        sys.exit(1)
+    output = compile_snapshot(sys.argv[1], sys.argv[2] if len(sys.argv) == 3 else None)
+    print(f"Wrote {output}")
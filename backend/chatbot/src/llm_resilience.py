@@ -0,0 +1,232 @@
+import asyncio
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+import httpx
+import requests
+
+# Consecutive failures that open the breaker, and how long it stays open
+BREAKER_FAILURES = int(os.getenv("SAM_LLM_BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("SAM_LLM_BREAKER_RESET_SECONDS", "30"))
+# Send a second, hedged request when the first one is slower than the p95
+HEDGE_ENABLED = os.getenv("SAM_LLM_HEDGE", "0") == "1"
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+# What a deadline running out looks like on the async and the sync path
+TIMEOUT_ERRORS = (
+    asyncio.TimeoutError,
+    TimeoutError,
+    httpx.TimeoutException,
+    requests.exceptions.Timeout,
+)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the LLM while the circuit breaker is open."""
+
+
+class CallerError(Exception):
+    """Wraps an error raised on the caller's side during a call, e.g. a client
+    that went away while a reply was streamed to it.
+
+    It says nothing about the upstream, so it never counts as a failure;
+    call_async re-raises the wrapped error.
+    """
+
+    def __init__(self, error):
+        super().__init__(str(error))
+        self.error = error
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    Closed: every call goes through. After ``failures`` failures in a row
+    it opens and rejects calls for ``reset_after`` seconds, then lets a
+    single probe through (half-open); the probe's outcome closes or
+    re-opens it.
+    """
+
+    def __init__(self, failures=BREAKER_FAILURES, reset_after=BREAKER_RESET_SECONDS):
+        self.failures = failures
+        self.reset_after = reset_after
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self.rejected = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Return whether a call may go upstream now."""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_after:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def is_open(self):
+        """Return whether calls are currently being rejected."""
+        with self._lock:
+            if self.state == "half_open":
+                # Only the probe in flight gets through
+                return self._probing
+            return (
+                self.state == "open"
+                and time.monotonic() - self.opened_at < self.reset_after
+            )
+
+    def release_probe(self):
+        """Free the half-open probe slot after a call ended without an outcome."""
+        with self._lock:
+            if self.state == "half_open":
+                self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._probing = False
+            if self.state == "half_open" or self.consecutive_failures >= self.failures:
+                if self.state != "open":
+                    self.times_opened += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+            }
+
+
+class LatencyBudget:
+    """Deadlines, optional hedging and a circuit breaker around upstream calls.
+
+    Latencies of successful calls are kept per name in a rolling window so
+    that the hedge delay can follow the observed p95. The counters are
+    shared by the event loop and the threads making sync calls.
+    """
+
+    def __init__(self, breaker=None, hedge=HEDGE_ENABLED):
+        self.breaker = breaker or CircuitBreaker()
+        self.hedge = hedge
+        self.timeouts = defaultdict(int)
+        self.hedges = 0
+        self._latencies = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+        self._lock = threading.Lock()
+
+    def p95(self, name):
+        """Return the p95 latency for a name, or None if there are too few samples."""
+        with self._lock:
+            samples = self._latencies.get(name, ())
+            if len(samples) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(samples)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+    def _check_breaker(self):
+        if not self.breaker.allow():
+            raise CircuitOpenError("LLM circuit breaker is open")
+
+    def _record(self, name, start, error=None):
+        if error is None:
+            self.breaker.record_success()
+            with self._lock:
+                self._latencies[name].append(time.monotonic() - start)
+            return
+        if isinstance(error, TIMEOUT_ERRORS):
+            with self._lock:
+                self.timeouts[name] += 1
+        self.breaker.record_failure()
+
+    async def call_async(self, name, make_call, deadline, hedge=True):
+        """Await make_call() within the deadline, hedging once after the p95 if enabled."""
+        self._check_breaker()
+        start = time.monotonic()
+        try:
+            hedge_after = self.p95(name) if self.hedge and hedge else None
+            if hedge_after is None or hedge_after >= deadline:
+                result = await asyncio.wait_for(make_call(), deadline)
+            else:
+                result = await self._hedged(make_call, deadline, hedge_after)
+        except asyncio.CancelledError:
+            # A cancelled call says nothing about the upstream, but if it
+            # was the half-open probe the next call has to be let through
+            self.breaker.release_probe()
+            raise
+        except CallerError as e:
+            self.breaker.release_probe()
+            raise e.error from None
+        except BaseException as e:
+            self._record(name, start, e)
+            raise
+        self._record(name, start)
+        return result
+
+    async def _hedged(self, make_call, deadline, hedge_after):
+        tasks = {asyncio.ensure_future(make_call())}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            if not done:
+                with self._lock:
+                    self.hedges += 1
+                tasks.add(asyncio.ensure_future(make_call()))
+            end = asyncio.get_running_loop().time() + deadline - hedge_after
+            error = None
+            while tasks:
+                remaining = end - asyncio.get_running_loop().time()
+                done, _ = await asyncio.wait(
+                    tasks, timeout=max(remaining, 0), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    raise asyncio.TimeoutError()
+                for task in done:
+                    tasks.discard(task)
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def call(self, name, make_call):
+        """Run a blocking make_call() through the breaker; its own timeout is the deadline."""
+        self._check_breaker()
+        start = time.monotonic()
+        try:
+            result = make_call()
+        except Exception as e:
+            self._record(name, start, e)
+            raise
+        self._record(name, start)
+        return result
+
+    def stats(self):
+        with self._lock:
+            timeouts = dict(self.timeouts)
+            hedges = self.hedges
+            names = list(self._latencies)
+        return {
+            "breaker": self.breaker.stats(),
+            "timeouts": timeouts,
+            "hedges": hedges,
+            "p95_seconds": {name: self.p95(name) for name in names},
+        }
@@ -1,22 +1,262 @@
+import asyncio
+import hashlib
 import os
+import threading
+from concurrent.futures import Future
 import requests
+import httpx
 import json
 from dotenv import load_dotenv
 
+from .llm_resilience import CallerError, LatencyBudget
+
 load_dotenv()
 OPENROUTER_KEY = "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"
+OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+LLM_MODEL = "mistralai/mistral-7b-instruct"
+
+# Seconds to wait for a completion before giving up and using the fallback
+LLM_TIMEOUT = float(os.getenv("SAM_LLM_TIMEOUT_SECONDS", "30"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("SAM_LLM_CONNECT_TIMEOUT_SECONDS", "5"))
+# Size of the keep-alive pool shared by all websocket sessions of a worker
+LLM_MAX_CONNECTIONS = int(os.getenv("SAM_LLM_MAX_CONNECTIONS", "20"))
+# Per-function deadlines in seconds, overridable with SAM_LLM_DEADLINE_<NAME>;
+# past the deadline the caller gets the function's fallback
+LLM_DEADLINES = {
+    name: float(os.getenv(f"SAM_LLM_DEADLINE_{name.upper()}", default))
+    for name, default in [
+        ("extract_intent", "8"),
+        ("get_ai_recommendations", "10"),
+        ("format_recipe_response", "30"),
+        ("format_inventory_response", "15"),
+        ("format_dish_ingredients_response", "15"),
+    ]
+}
+
+_session = requests.Session()
+_async_client = None
+_async_client_loop = None
+
+# Single-flight: identical requests that overlap in time share one upstream
+# call. Keyed by prompt fingerprint; entries live only while the call runs.
+_in_flight_async = {}
+_in_flight_sync = {}
+_in_flight_lock = threading.Lock()
+_flight_stats = {"upstream": 0, "coalesced": 0}
+
+# Deadlines, hedging and the circuit breaker shared by every LLM call
+_budget = LatencyBudget()
 
-def extract_intent(query):
-    headers = {
+
+def _headers(title="SAM-AI"):
+    return {
         "Authorization": f"Bearer {OPENROUTER_KEY}",
         "HTTP-Referer": "http://localhost",
-        "X-Title": "SAM-AI",
+        "X-Title": title,
     }
 
-    messages = [
-        {
-            "role": "user",
-            "content": f"""
+
+def _payload(prompt):
+    return {
+        "model": LLM_MODEL,
+        "messages": [{"role": "user", "content": prompt}],
+    }
+
+
+def _fingerprint(prompt, title):
+    payload = json.dumps([title, _payload(prompt)], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _deadline(name, timeout):
+    return timeout or LLM_DEADLINES.get(name, LLM_TIMEOUT)
+
+
+def _post(prompt, title, timeout):
+    response = _session.post(
+        OPENROUTER_URL,
+        headers=_headers(title),
+        json=_payload(prompt),
+        timeout=(LLM_CONNECT_TIMEOUT, timeout or LLM_TIMEOUT),
+    )
+    return response.json()["choices"][0]["message"]["content"]
+
+
+def _complete(prompt, name, title="SAM-AI", timeout=None):
+    """Send one chat completion over the shared session and return the reply text.
+
+    Threads asking for the same prompt at the same time wait for one call.
+    """
+    key = _fingerprint(prompt, title)
+    with _in_flight_lock:
+        future = _in_flight_sync.get(key)
+        leader = future is None
+        if leader:
+            future = _in_flight_sync[key] = Future()
+            _flight_stats["upstream"] += 1
+        else:
+            _flight_stats["coalesced"] += 1
+    if not leader:
+        return future.result()
+
+    try:
+        deadline = _deadline(name, timeout)
+        future.set_result(_budget.call(name, lambda: _post(prompt, title, deadline)))
+    except BaseException as e:
+        future.set_exception(e)
+    finally:
+        with _in_flight_lock:
+            del _in_flight_sync[key]
+    return future.result()
+
+
+def get_async_client():
+    """Return the pooled AsyncClient for the running event loop, creating it on first use."""
+    global _async_client, _async_client_loop
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client_loop is not loop:
+        _async_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_CONNECTIONS,
+            ),
+        )
+        _async_client_loop = loop
+    return _async_client
+
+
+async def close_async_client():
+    """Close the pooled AsyncClient, e.g. on application shutdown."""
+    global _async_client, _async_client_loop
+    if _async_client is not None:
+        await _async_client.aclose()
+    _async_client = None
+    _async_client_loop = None
+
+
+async def _post_async(prompt, title, timeout):
+    response = await get_async_client().post(
+        OPENROUTER_URL,
+        headers=_headers(title),
+        json=_payload(prompt),
+        timeout=httpx.Timeout(timeout or LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+    )
+    return response.json()["choices"][0]["message"]["content"]
+
+
+async def _complete_async(prompt, name, title="SAM-AI", timeout=None):
+    """Send one chat completion over the pooled AsyncClient and return the reply text.
+
+    Coroutines asking for the same prompt while a call is in flight await
+    that call's result instead of sending their own request.
+    """
+    key = (asyncio.get_running_loop(), _fingerprint(prompt, title))
+    task = _in_flight_async.get(key)
+    if task is None:
+        deadline = _deadline(name, timeout)
+        task = asyncio.ensure_future(
+            _budget.call_async(
+                name, lambda: _post_async(prompt, title, deadline), deadline
+            )
+        )
+        _in_flight_async[key] = task
+        task.add_done_callback(lambda _: _in_flight_async.pop(key, None))
+        _flight_stats["upstream"] += 1
+    else:
+        _flight_stats["coalesced"] += 1
+    # Shielded so that one caller giving up doesn't cancel the call for the rest
+    return await asyncio.shield(task)
+
+
+async def _stream_async(prompt, on_delta, title="SAM-AI", timeout=None):
+    """Stream one chat completion, awaiting on_delta(text) for every chunk; returns the full text.
+
+    Errors from on_delta (the shopper closed the socket) are raised as
+    CallerError, so they never count against the LLM's circuit breaker.
+    """
+    parts = []
+    async with get_async_client().stream(
+        "POST",
+        OPENROUTER_URL,
+        headers=_headers(title),
+        json={**_payload(prompt), "stream": True},
+        timeout=httpx.Timeout(timeout or LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+    ) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            # Server-sent events; lines starting with ":" are keep-alive comments
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:") :].strip()
+            if data == "[DONE]":
+                break
+            choices = json.loads(data).get("choices") or [{}]
+            text = (choices[0].get("delta") or {}).get("content")
+            if text:
+                parts.append(text)
+                try:
+                    await on_delta(text)
+                except Exception as e:
+                    raise CallerError(e)
+    if not parts:
+        raise ValueError("Streamed completion was empty")
+    return "".join(parts)
+
+
+async def _complete_or_stream(prompt, name, on_delta=None, title="SAM-AI", timeout=None):
+    if on_delta is None:
+        return await _complete_async(prompt, name, title=title, timeout=timeout)
+    deadline = _deadline(name, timeout)
+    # Streams are never hedged: the shopper is already watching this one
+    return await _budget.call_async(
+        name,
+        lambda: _stream_async(prompt, on_delta, title=title, timeout=deadline),
+        deadline,
+        hedge=False,
+    )
+
+
+# Prompts and fallbacks, shared by the sync and async functions below
+
+# Few-shot examples for the intent prompt; the local intent classifier is
+# benchmarked against the same list.
+INTENT_EXAMPLES = [
+    ("I want to eat ramen", {"intent": "dish_ingredients", "product": "ramen", "filter": ""}),
+    ("I want to make pasta", {"intent": "dish_ingredients", "product": "pasta", "filter": ""}),
+    ("Do you have onions?", {"intent": "product_search", "product": "onions", "filter": ""}),
+    ("I need household items", {"intent": "category_search", "product": "household items", "filter": ""}),
+    ("Looking for cleaning products", {"intent": "category_search", "product": "cleaning products", "filter": ""}),
+    ("Show me snacks", {"intent": "category_search", "product": "snacks", "filter": ""}),
+    ("What categories do you have?", {"intent": "category_list", "product": "", "filter": ""}),
+    ("Show me all sections", {"intent": "category_list", "product": "", "filter": ""}),
+    ("What departments are available?", {"intent": "category_list", "product": "", "filter": ""}),
+    ("Suggest something for a birthday", {"intent": "suggestion", "product": "", "filter": ""}),
+    ("I need a recipe for pasta", {"intent": "recipe", "product": "pasta", "filter": ""}),
+    ("What can I make with rice and chicken?", {"intent": "recipe", "product": ["rice", "chicken"], "filter": ""}),
+    ("Recipe using eggs and flour", {"intent": "recipe", "product": ["eggs", "flour"], "filter": ""}),
+    ("What do I need for ramen?", {"intent": "dish_ingredients", "product": "ramen", "filter": ""}),
+    ("Ingredients for chocolate cake", {"intent": "dish_ingredients", "product": "chocolate cake", "filter": ""}),
+    ("Do you have plastic cups and plates?", {"intent": "product_search", "product": ["plastic cups", "plates"], "filter": ""}),
+    ("Hello", {"intent": "greeting", "product": "", "filter": ""}),
+    ("Hi there", {"intent": "greeting", "product": "", "filter": ""}),
+    ("Goodbye", {"intent": "farewell", "product": "", "filter": ""}),
+    ("Thank you", {"intent": "thank_you", "product": "", "filter": ""}),
+    ("Thanks for the help", {"intent": "thank_you", "product": "", "filter": ""}),
+    ("Who are you?", {"intent": "personal", "product": "", "filter": ""}),
+    ("What's the weather like?", {"intent": "conversational", "product": "", "filter": ""}),
+    ("How was your day?", {"intent": "conversational", "product": "", "filter": ""}),
+]
+
+
+def _format_intent_examples():
+    return "\n".join(
+        f'- "{query}" -> {json.dumps(expected)}' for query, expected in INTENT_EXAMPLES
+    )
+
+
+def _intent_prompt(query):
+    return f"""
 You are a smart shopping assistant. Your goal is to analyze a user\'s query and extract key information into a structured JSON format.
 
 Here are the possible intents:
@@ -40,66 +280,16 @@ From the query, you must identify:
 - "filter": Any additional context, like an event ("diwali"), a theme ("healthy"), or a quality ("eco-friendly").
 
 Examples:
--"I want to eat ramen" -> {{"intent": "dish_ingredients", "product": "ramen", "filter": ""}}
--"I want to make pasta" -> {{"intent": "dish_ingredients", "product": "pasta", "filter": ""}}
-- "Do you have onions?" -> {{"intent": "product_search", "product": "onions", "filter": ""}}
-- "I need household items" -> {{"intent": "category_search", "product": "household items", "filter": ""}}
-- "Looking for cleaning products" -> {{"intent": "category_search", "product": "cleaning products", "filter": ""}}
-- "Show me snacks" -> {{"intent": "category_search", "product": "snacks", "filter": ""}}
-- "What categories do you have?" -> {{"intent": "category_list", "product": "", "filter": ""}}
-- "Show me all sections" -> {{"intent": "category_list", "product": "", "filter": ""}}
-- "What departments are available?" -> {{"intent": "category_list", "product": "", "filter": ""}}
-- "Suggest something for a birthday" -> {{"intent": "suggestion", "product": "", "filter": ""}}
-- "I need a recipe for pasta" -> {{"intent": "recipe", "product": "pasta", "filter": ""}}
-- "What can I make with rice and chicken?" -> {{"intent": "recipe", "product": ["rice", "chicken"], "filter": ""}}
-- "Recipe using eggs and flour" -> {{"intent": "recipe", "product": ["eggs", "flour"], "filter": ""}}
-- "What do I need for ramen?" -> {{"intent": "dish_ingredients", "product": "ramen", "filter": ""}}
-- "Ingredients for chocolate cake" -> {{"intent": "dish_ingredients", "product": "chocolate cake", "filter": ""}}
-- "Do you have plastic cups and plates?" -> {{"intent": "product_search", "product": ["plastic cups", "plates"], "filter": ""}}
-- "Hello" -> {{"intent": "greeting", "product": "", "filter": ""}}
-- "Hi there" -> {{"intent": "greeting", "product": "", "filter": ""}}
-- "Goodbye" -> {{"intent": "farewell", "product": "", "filter": ""}}
-- "Thank you" -> {{"intent": "thank_you", "product": "", "filter": ""}}
-- "Thanks for the help" -> {{"intent": "thank_you", "product": "", "filter": ""}}
-- "Who are you?" -> {{"intent": "personal", "product": "", "filter": ""}}
-- "What's the weather like?" -> {{"intent": "conversational", "product": "", "filter": ""}}
-- "How was your day?" -> {{"intent": "conversational", "product": "", "filter": ""}}
+{_format_intent_examples()}
 
 User query: "{query}"
 
 Return a minified JSON object with no extra text or markdown.
-""",
-        }
-    ]
+"""
 
-    data = {
-        "model": "mistralai/mistral-7b-instruct",
-        "messages": messages,
-    }
 
-    response = requests.post(
-        "https://openrouter.ai/api/v1/chat/completions", headers=headers, json=data
-    )
-
-    try:
-        content = response.json()["choices"][0]["message"]["content"]
-        return json.loads(content)
-    except Exception as e:
-        print("LLM Error:", e)
-        return {"intent": "unknown", "product": "", "filter": ""}
-
-
-def get_ai_recommendations(query):
-    headers = {
-        "Authorization": f"Bearer {OPENROUTER_KEY}",
-        "HTTP-Referer": "http://localhost",
-        "X-Title": "SAM-AI",
-    }
-
-    messages = [
-        {
-            "role": "user",
-            "content": f"""
+def _recommendations_prompt(query):
+    return f"""
 You are a shopping assistant. Based on the user's request, suggest a list of 3-5 products that would be relevant.
 
 Return ONLY a valid JSON array of strings. For example, for the query "I'm planning a movie night", you could return `["popcorn", "soda", "pizza", "candy"]`.
@@ -107,126 +297,38 @@ Return ONLY a valid JSON array of strings. For example, for the query "I'm plann
 User query: "{query}"
 
 Return a minified JSON array of strings.
-""",
-        }
-    ]
+"""
 
-    data = {
-        "model": "mistralai/mistral-7b-instruct",
-        "messages": messages,
-    }
-
-    response = requests.post(
-        "https://openrouter.ai/api/v1/chat/completions", headers=headers, json=data
-    )
-
-    try:
-        content = response.json()["choices"][0]["message"]["content"]
-        return json.loads(content)
-    except Exception as e:
-        print("LLM Error:", e)
-        return []
-
-
-def format_recipe_response(recipe_details):
-    headers = {
-        "Authorization": f"Bearer {OPENROUTER_KEY}",
-        "HTTP-Referer": "http://localhost",
-        "X-Title": "SAM-AI",
-    }
 
+def _recipe_prompt(recipe_details):
     # Convert the dictionary to a JSON string for the prompt
     details_json = json.dumps(recipe_details, indent=2)
-
-    messages = [
-        {
-            "role": "user",
-            "content": f"""
+    return f"""
 You are a helpful cooking assistant. Please format the following recipe details in a clear, user-friendly way. The user should be able to read this and start cooking right away. Make sure to include the ingredients, instructions, and any other relevant details from the provided JSON.
 
 Recipe Details (JSON):
 {details_json}
 
 Return only the formatted recipe as a single string, with no extra text or explanations.
-""",
-        }
-    ]
-
-    data = {
-        "model": "mistralai/mistral-7b-instruct",
-        "messages": messages,
-    }
-
-    response = requests.post(
-        "https://openrouter.ai/api/v1/chat/completions", headers=headers, json=data
-    )
+"""
 
-    try:
-        content = response.json()["choices"][0]["message"]["content"]
-        return content
-    except Exception as e:
-        print(f"LLM Error: {e}")
-        # Fallback to a simple formatted string if the API fails
-        return f"Recipe details:\n{json.dumps(recipe_details, indent=2)}"
-
-
-def format_inventory_response(inventory_results):
-    """Formats a list of inventory search results into a single, natural response using an LLM."""
-    headers = {
-        "Authorization": f"Bearer {OPENROUTER_KEY}",
-        "HTTP-Referer": "http://localhost",
-        "X-Title": "SmartShoppingCLI",
-    }
 
+def _inventory_prompt(inventory_results):
     # Combine the list of results into a single string for the prompt
     results_str = "\n".join(inventory_results)
-
-    messages = [
-        {
-            "role": "user",
-            "content": f"""
+    return f"""
 You are a helpful and friendly shopping assistant. Your task is to summarize the following inventory search results into a single, conversational response. Combine the information naturally, as if you were speaking to a customer in a store. If you find multiple items, mention them all in a friendly way. Also, if you find any items which are not sustainable, urge the user to consider more eco-friendly options. Make the response concise and engaging.
 
 Here are the search results:
 {results_str}
 
 Now, please provide a summary. For example, if the results say two items are in stock, you could say something like: 'Yes, I found both of those for you! The Onions are in Aisle 1-a, and the Potatoes are in Aisle 1-f.' If an item is not found, mention that as well. After the summary, ask a relevant follow-up question, like 'Can I help you find anything else?' or 'Would you like a recipe for any of these items?'.
-""",
-        }
-    ]
-
-    data = {
-        "model": "mistralai/mistral-7b-instruct",
-        "messages": messages,
-    }
-
-    response = requests.post(
-        "https://openrouter.ai/api/v1/chat/completions", headers=headers, json=data
-    )
-
-    try:
-        content = response.json()["choices"][0]["message"]["content"]
-        return content
-    except Exception as e:
-        print(f"LLM Error: {e}")
-        # Fallback to a simple formatted string if the API fails
-        return "\n".join(inventory_results)
-
+"""
 
-def format_dish_ingredients_response(dish_name, ingredients_info):
-    """Formats dish ingredients information into a natural response using LLM."""
-    headers = {
-        "Authorization": f"Bearer {OPENROUTER_KEY}",
-        "HTTP-Referer": "http://localhost",
-        "X-Title": "SAM-AI",
-    }
 
+def _dish_ingredients_prompt(dish_name, ingredients_info):
     ingredients_str = "\n".join(ingredients_info)
-
-    messages = [
-        {
-            "role": "user",
-            "content": f"""
+    return f"""
 You are a helpful shopping assistant. The user asked about ingredients for "{dish_name}".
 
 Based on the inventory results below, provide a SHORT, friendly summary (3-4 Bullet points) that:
@@ -240,23 +342,161 @@ Inventory results:
 {ingredients_str}
 
 Provide only a brief, conversational response.
-""",
-        }
-    ]
+"""
 
-    data = {
-        "model": "mistralai/mistral-7b-instruct",
-        "messages": messages,
-    }
 
-    response = requests.post(
-        "https://openrouter.ai/api/v1/chat/completions", headers=headers, json=data
-    )
+def _unknown_intent():
+    return {"intent": "unknown", "product": "", "filter": ""}
+
+
+def _recipe_fallback(recipe_details):
+    return f"Recipe details:\n{json.dumps(recipe_details, indent=2)}"
+
+
+def _inventory_fallback(inventory_results):
+    return "\n".join(inventory_results)
+
+
+def _dish_ingredients_fallback(dish_name, ingredients_info):
+    ingredients_str = "\n".join(ingredients_info)
+    return f"Ingredients needed for {dish_name}:\n{ingredients_str}"
+
+
+def extract_intent(query, timeout=None):
+    try:
+        return json.loads(_complete(_intent_prompt(query), "extract_intent", timeout=timeout))
+    except Exception as e:
+        print("LLM Error:", e)
+        return _unknown_intent()
+
+
+def get_ai_recommendations(query, timeout=None):
+    try:
+        return json.loads(
+            _complete(_recommendations_prompt(query), "get_ai_recommendations", timeout=timeout)
+        )
+    except Exception as e:
+        print("LLM Error:", e)
+        return []
+
+
+def format_recipe_response(recipe_details, timeout=None):
+    try:
+        return _complete(
+            _recipe_prompt(recipe_details), "format_recipe_response", timeout=timeout
+        )
+    except Exception as e:
+        print(f"LLM Error: {e}")
+        # Fallback to a simple formatted string if the API fails
+        return _recipe_fallback(recipe_details)
+
+
+def format_inventory_response(inventory_results, timeout=None):
+    """Formats a list of inventory search results into a single, natural response using an LLM."""
+    try:
+        return _complete(
+            _inventory_prompt(inventory_results),
+            "format_inventory_response",
+            title="SmartShoppingCLI",
+            timeout=timeout,
+        )
+    except Exception as e:
+        print(f"LLM Error: {e}")
+        # Fallback to a simple formatted string if the API fails
+        return _inventory_fallback(inventory_results)
+
 
+def format_dish_ingredients_response(dish_name, ingredients_info, timeout=None):
+    """Formats dish ingredients information into a natural response using LLM."""
     try:
-        content = response.json()["choices"][0]["message"]["content"]
-        return content
+        return _complete(
+            _dish_ingredients_prompt(dish_name, ingredients_info),
+            "format_dish_ingredients_response",
+            timeout=timeout,
+        )
     except Exception as e:
         print(f"LLM Error: {e}")
         # Fallback to a simple formatted string if the API fails
-        return f"Ingredients needed for {dish_name}:\n{ingredients_str}"
+        return _dish_ingredients_fallback(dish_name, ingredients_info)
+
+
+# Async counterparts, for use from the websocket handlers. They share one
+# pooled connection per worker and never block the event loop. The format_*
+# functions take an optional on_delta coroutine function; when given, the
+# reply is streamed and each chunk is passed to it as it arrives.
+
+
+async def extract_intent_async(query, timeout=None):
+    try:
+        return json.loads(
+            await _complete_async(_intent_prompt(query), "extract_intent", timeout=timeout)
+        )
+    except Exception as e:
+        print("LLM Error:", e)
+        return _unknown_intent()
+
+
+async def get_ai_recommendations_async(query, timeout=None):
+    try:
+        return json.loads(
+            await _complete_async(
+                _recommendations_prompt(query), "get_ai_recommendations", timeout=timeout
+            )
+        )
+    except Exception as e:
+        print("LLM Error:", e)
+        return []
+
+
+async def format_recipe_response_async(recipe_details, timeout=None, on_delta=None):
+    try:
+        return await _complete_or_stream(
+            _recipe_prompt(recipe_details),
+            "format_recipe_response",
+            on_delta,
+            timeout=timeout,
+        )
+    except Exception as e:
+        print(f"LLM Error: {e}")
+        return _recipe_fallback(recipe_details)
+
+
+async def format_inventory_response_async(inventory_results, timeout=None, on_delta=None):
+    """Async version of format_inventory_response."""
+    try:
+        return await _complete_or_stream(
+            _inventory_prompt(inventory_results),
+            "format_inventory_response",
+            on_delta,
+            title="SmartShoppingCLI",
+            timeout=timeout,
+        )
+    except Exception as e:
+        print(f"LLM Error: {e}")
+        return _inventory_fallback(inventory_results)
+
+
+async def format_dish_ingredients_response_async(
+    dish_name, ingredients_info, timeout=None, on_delta=None
+):
+    """Async version of format_dish_ingredients_response."""
+    try:
+        return await _complete_or_stream(
+            _dish_ingredients_prompt(dish_name, ingredients_info),
+            "format_dish_ingredients_response",
+            on_delta,
+            timeout=timeout,
+        )
+    except Exception as e:
+        print(f"LLM Error: {e}")
+        return _dish_ingredients_fallback(dish_name, ingredients_info)
+
+
+def llm_available():
+    """Return False while the circuit breaker is sending every LLM call to its fallback."""
+    return not _budget.breaker.is_open()
+
+
+def llm_client_stats():
+    """Return upstream vs coalesced call counts, breaker state, timeouts and hedges."""
+    return {**_flight_stats, **_budget.stats()}
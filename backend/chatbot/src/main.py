@@ -1,17 +1,19 @@
-from .llm_utils import (
-    extract_intent,
-    format_inventory_response,
-)
+from .llm_utils import format_inventory_response_async
+from .response_templates import render_inventory_response, use_template
+from .intent_classifier import resolve_intent_async
+from .speculative_search import SpeculativeSearch
+from .search_service import run_search, run_store_search
 from .recipe_fetcher import handle_recipe_search, handle_dish_ingredients_search
 from .audio_utils import speak, listen
 from .product_search import (
-    search_inventory,
+    lookup_products_async,
+    search_inventory_result,
     suggest_sustainable,
     search_by_category,
     get_category_from_keywords,
     list_all_categories,
 )
-from .product_recommendation import recommend_products
+from .product_recommendation import recommend_products_async
 from .conversational_handler import (
     get_conversational_response,
     is_personal_question,
@@ -19,6 +21,7 @@ from .conversational_handler import (
     is_thank_you,
 )
 import pandas as pd
+import asyncio
 import json
 
 
@@ -36,13 +39,43 @@ async def get_input(send, receive, input_method="text"):
     #     return query
 
 
-async def assistant(send, receive, inventory_csv_url):
+def _delta_sender(send):
+    """Return an on_delta callback that forwards streamed text as {"delta": ...} frames."""
+
+    async def on_delta(text):
+        await send(json.dumps({"delta": text}))
+
+    return on_delta
+
+
+async def _format_results(results, on_delta=None):
+    """Turn ProductResults into a reply, from a template or the LLM per SAM_FORMAT_POLICY."""
+    if use_template(results):
+        return render_inventory_response(results)
+    return await format_inventory_response_async(
+        [result.message for result in results], on_delta=on_delta
+    )
+
+
+async def _sustainable_alternatives(products, enabled=True):
+    """Look up sustainable alternatives for several products concurrently."""
+    if not enabled:
+        return [None] * len(products)
+    return await asyncio.gather(
+        *(run_search(suggest_sustainable, product) for product in products)
+    )
+
+
+async def assistant(send, receive, inventory_csv_url, stream=False):
     """
     Sends a single, merged welcome message from SAM AI.
 
     Args:
         send: The WebSocket send function (e.g., from `websocket.send`).
+        stream: Stream LLM-formatted replies as {"delta": ...} frames before
+            the usual {"message": ...} frame with the full text.
     """
+    on_delta = _delta_sender(send) if stream else None
     welcome_message = (
         "Hello there! I'm SAM AI, your friendly shopping assistant! 🛒\n\n"
         "I can help you with:\n"
@@ -91,7 +124,12 @@ async def assistant(send, receive, inventory_csv_url):
             continue
 
         await send(json.dumps({"message":"...Thinking..."}))
-        parsed = extract_intent(query)
+        speculation = SpeculativeSearch(query, inventory_csv_url)
+        try:
+            parsed = await resolve_intent_async(query)
+        except BaseException:
+            speculation.discard()
+            raise
         intent = parsed.get("intent")
         product_data = parsed.get("product", "")
         filter_val = parsed.get("filter", "").strip()
@@ -101,6 +139,7 @@ async def assistant(send, receive, inventory_csv_url):
             if isinstance(product_data, list)
             else [product_data.strip()]
         )
+        lookups = await speculation.settle(intent, products_to_process)
 
         # if intent == "product_search":
         #     await send("...Searching inventory...")
@@ -131,30 +170,35 @@ async def assistant(send, receive, inventory_csv_url):
             await send(json.dumps({"message":"...Searching inventory..."}))
             inventory_results = []
             sustainable_suggestions = []
-            for product in products_to_process:
-                if not product:
-                    continue
-                result = await search_inventory(
-                    product, send, receive, inventory_csv_url
+            products = [product for product in products_to_process if product]
+            # Resolve every product and its sustainable alternative at once;
+            # only choosing between several matches happens one by one below
+            lookups, alternatives = await asyncio.gather(
+                lookup_products_async(products, inventory_csv_url, lookups),
+                _sustainable_alternatives(
+                    products, "eco" not in filter_val and "sustain" not in filter_val
+                ),
+            )
+            for product, alt in zip(products, alternatives):
+                result = await search_inventory_result(
+                    product, send, receive, inventory_csv_url, lookups.get(product)
                 )
 
                 # Check if user canceled the selection
-                if "Selection canceled" in result:
+                if result.status == "canceled":
                     # speak_wrapper(result)
                     await send(json.dumps(
-                        {"message": result, "buttons": []}
+                        {"message": result.message, "buttons": []}
                     ))  # Exit early, don't process further or format with LLM
                     return
 
                 inventory_results.append(result)
                 # Proactive sustainable suggestion if available
-                if "eco" not in filter_val and "sustain" not in filter_val:
-                    alt = suggest_sustainable(product)
-                    if alt:
-                        sustainable_suggestions.append(alt)
+                if alt:
+                    sustainable_suggestions.append(alt)
 
             if inventory_results:
-                formatted_response = format_inventory_response(inventory_results)
+                formatted_response = await _format_results(inventory_results, on_delta)
                 # speak_wrapper(formatted_response)
                 await send(json.dumps({"message": formatted_response, "buttons": []}))
 
@@ -177,23 +221,25 @@ async def assistant(send, receive, inventory_csv_url):
             # First try to detect category from the query
             detected_category = get_category_from_keywords(category_query)
             if detected_category:
-                category_results = search_by_category(
-                    detected_category, inventory_csv_url
+                category_results = await run_store_search(
+                    inventory_csv_url, search_by_category, detected_category, inventory_csv_url
                 )
                 # speak_wrapper(category_results)
                 await send(json.dumps({"message":category_results}))
             else:
                 # Fallback to regular search
                 inventory_results = []
-                for product in products_to_process:
-                    if not product:
-                        continue
+                products = [product for product in products_to_process if product]
+                lookups = await lookup_products_async(products, inventory_csv_url)
+                for product in products:
                     inventory_results.append(
-                        search_inventory(product, send, receive, inventory_csv_url)
+                        await search_inventory_result(
+                            product, send, receive, inventory_csv_url, lookups.get(product)
+                        )
                     )
 
                 if inventory_results:
-                    formatted_response = format_inventory_response(inventory_results)
+                    formatted_response = await _format_results(inventory_results, on_delta)
                     # speak_wrapper(formatted_response)
                     await send(json.dumps({"message":formatted_response}))
                 else:
@@ -203,7 +249,9 @@ async def assistant(send, receive, inventory_csv_url):
 
         elif intent == "category_list":
             await send(json.dumps({"message":"...Loading all categories..."}))
-            categories_response = list_all_categories(inventory_csv_url)
+            categories_response = await run_store_search(
+                inventory_csv_url, list_all_categories, inventory_csv_url
+            )
             # speak_wrapper(categories_response)
             await send(json.dumps({"message":categories_response}))
 
@@ -277,7 +325,9 @@ async def assistant(send, receive, inventory_csv_url):
                     return
 
             await send(json.dumps({"message":f"Searching for recipes with: {', '.join(cleaned_products)}"}))
-            await handle_recipe_search(cleaned_products, send, receive, "text")
+            await handle_recipe_search(
+                cleaned_products, send, receive, inventory_csv_url, "text", on_delta=on_delta
+            )
 
         elif intent == "dish_ingredients":
             await send(json.dumps({"message":"...Finding dish ingredients..."}))
@@ -287,14 +337,13 @@ async def assistant(send, receive, inventory_csv_url):
                 else query
             )
             await handle_dish_ingredients_search(
-                dish_name, send, receive, inventory_csv_url, "text"
+                dish_name, send, receive, inventory_csv_url, "text", on_delta=on_delta
             )
         elif intent == "sustainability":
             await send(json.dumps({"message":"...Finding sustainable alternatives..."}))
-            for product in products_to_process:
-                if not product:
-                    continue
-                suggestion = suggest_sustainable(product)
+            products = [product for product in products_to_process if product]
+            suggestions = await _sustainable_alternatives(products)
+            for product, suggestion in zip(products, suggestions):
                 if suggestion:
                     # speak_wrapper(f"Absolutely! {suggestion}")
                     await send(json.dumps({"message":f"Absolutely! {suggestion}"}))
@@ -314,7 +363,7 @@ async def assistant(send, receive, inventory_csv_url):
                 if products_to_process and any(products_to_process)
                 else filter_val or query
             )
-            theme, products = recommend_products(query_for_suggestion)
+            theme, products = await recommend_products_async(query_for_suggestion)
             if isinstance(products, pd.DataFrame) and not products.empty:
                 suggestions_list = [
                     f"  - {row['name']} (in {row['location']})"
@@ -0,0 +1,190 @@
+import sys
+
+import numpy as np
+
+# Candidate lists at or below this size are verified directly instead of
+# being intersected with further posting lists.
+_VERIFY_THRESHOLD = 64
+
+
+def normalize_name(name):
+    """Lowercase a product name and collapse its whitespace."""
+    return " ".join(str(name).lower().split())
+
+
+def name_trigrams(text):
+    """Return the set of trigrams of a normalized name, padded at both ends."""
+    padded = f" {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class ProductIndex:
+    """Exact and substring lookup over a store's product names.
+
+    Exact hits are a dict probe on the normalized name. Substring search
+    intersects trigram posting lists, rarest first, and only verifies the
+    few rows that survive. Row ids are positions in the inventory frame.
+
+    The CSR posting arrays are never rewritten after a build. Rows added
+    later go to small per-trigram overflow lists, and removed rows are
+    tombstoned, so stock deltas don't require a rebuild.
+    """
+
+    def __init__(self, names, normalized=False):
+        if normalized:
+            self.norm_names = list(names)
+        else:
+            self.norm_names = [normalize_name(name) for name in names]
+
+        self.exact = {}
+        postings = {}
+        for row, name in enumerate(self.norm_names):
+            self.exact.setdefault(name, row)
+            for gram in name_trigrams(name):
+                postings.setdefault(gram, []).append(row)
+
+        # Posting lists are stored back to back (CSR layout), each in row order
+        self.gram_ids = {gram: i for i, gram in enumerate(postings)}
+        lengths = np.fromiter(
+            (len(rows) for rows in postings.values()),
+            dtype=np.int64,
+            count=len(postings),
+        )
+        self.offsets = np.zeros(len(postings) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self.offsets[1:])
+        self.postings = np.fromiter(
+            (row for rows in postings.values() for row in rows),
+            dtype=np.int32,
+            count=int(self.offsets[-1]),
+        )
+        self.extra_postings = {}
+        self.removed = set()
+
+    @classmethod
+    def from_arrays(cls, norm_names, grams, offsets, postings):
+        """Rebuild an index from its stored posting arrays, e.g. from a snapshot.
+
+        Only the exact-match dict and the trigram lookup are rebuilt; the
+        posting arrays are used as given, so they can live in a memory map.
+        """
+        index = cls.__new__(cls)
+        index.norm_names = list(norm_names)
+        index.exact = {}
+        for row, name in enumerate(index.norm_names):
+            index.exact.setdefault(name, row)
+        index.gram_ids = {gram: i for i, gram in enumerate(grams)}
+        index.offsets = offsets
+        index.postings = postings
+        index.extra_postings = {}
+        index.removed = set()
+        return index
+
+    def __len__(self):
+        return len(self.norm_names)
+
+    def memory_usage(self):
+        """Approximate bytes held by the index, not counting the name strings."""
+        return (
+            self.postings.nbytes
+            + self.offsets.nbytes
+            + sys.getsizeof(self.gram_ids)
+            + sum(sys.getsizeof(gram) for gram in self.gram_ids)
+            + sys.getsizeof(self.exact)
+            + sys.getsizeof(self.norm_names)
+            + sys.getsizeof(self.extra_postings)
+            + sum(sys.getsizeof(rows) for rows in self.extra_postings.values())
+            + sys.getsizeof(self.removed)
+        )
+
+    def copy(self):
+        """Return an index that can take adds and removals without changing this one.
+
+        The posting arrays are shared; only the per-row structures are copied.
+        """
+        index = ProductIndex.__new__(ProductIndex)
+        index.norm_names = list(self.norm_names)
+        index.exact = dict(self.exact)
+        index.gram_ids = self.gram_ids
+        index.offsets = self.offsets
+        index.postings = self.postings
+        index.extra_postings = {gram: list(rows) for gram, rows in self.extra_postings.items()}
+        index.removed = set(self.removed)
+        return index
+
+    def add(self, norm_names):
+        """Index rows appended to the end of the inventory frame."""
+        for name in norm_names:
+            row = len(self.norm_names)
+            self.norm_names.append(name)
+            self.exact.setdefault(name, row)
+            for gram in name_trigrams(name):
+                self.extra_postings.setdefault(gram, []).append(row)
+
+    def remove(self, rows):
+        """Tombstone rows so that no lookup returns them any more."""
+        self.removed.update(rows)
+        for row in rows:
+            name = self.norm_names[row]
+            if self.exact.get(name) != row:
+                continue
+            # Point the exact entry at the next live row with the same name
+            del self.exact[name]
+            for other in self.substring_rows(name):
+                if self.norm_names[other] == name:
+                    self.exact[name] = other
+                    break
+
+    def posting(self, gram):
+        """Return the rows whose name contains the given trigram."""
+        gram_id = self.gram_ids.get(gram)
+        if gram_id is None:
+            rows = self.postings[:0]
+        else:
+            rows = self.postings[self.offsets[gram_id] : self.offsets[gram_id + 1]]
+        extra = self.extra_postings.get(gram)
+        if extra:
+            # Added rows come after every built row, so order is kept
+            rows = np.concatenate((rows, np.asarray(extra, dtype=np.int32)))
+        return rows
+
+    def lookup_exact(self, query):
+        """Return the first row whose normalized name equals the query, or None."""
+        return self.exact.get(normalize_name(query))
+
+    def substring_candidates(self, query):
+        """Return rows that may contain the normalized query, as an array, or None for all rows.
+
+        Candidates are in row order and still have to be verified.
+        """
+        grams = {query[i : i + 3] for i in range(len(query) - 2)}
+        if not grams:
+            # Queries shorter than a trigram cannot use the index
+            return None
+        lists = sorted((self.posting(gram) for gram in grams), key=len)
+        candidates = lists[0]
+        if len(candidates) > _VERIFY_THRESHOLD and len(lists) > 1:
+            # One intersection removes most false positives; beyond that
+            # verifying in row order with an early exit is cheaper.
+            candidates = np.intersect1d(candidates, lists[1], assume_unique=True)
+        return candidates
+
+    def verify_rows(self, query, candidates, limit=None):
+        """Return the live candidates whose name contains the normalized query, in the given order."""
+        rows = []
+        removed = self.removed
+        for row in candidates:
+            if query in self.norm_names[row] and row not in removed:
+                rows.append(row)
+                if limit is not None and len(rows) >= limit:
+                    break
+        return rows
+
+    def substring_rows(self, query, limit=None):
+        """Return rows whose normalized name contains the query, in row order."""
+        query = normalize_name(query)
+        candidates = self.substring_candidates(query)
+        if candidates is None:
+            candidates = range(len(self.norm_names))
+        else:
+            candidates = candidates.tolist()
+        return self.verify_rows(query, candidates, limit)
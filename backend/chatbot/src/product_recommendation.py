@@ -1,7 +1,8 @@
 import pandas as pd
-from .llm_utils import get_ai_recommendations
+from .llm_utils import get_ai_recommendations, get_ai_recommendations_async
 
 from .utils import inventory_csv_path
+from .search_service import run_search
 
 inventory = pd.read_csv(inventory_csv_path, encoding="utf-8-sig")
 
@@ -17,26 +18,19 @@ RECOMMENDATION_KEYWORDS = {
 }
 
 
-def recommend_products(query):
-    """Recommends products from inventory based on query keywords or AI suggestions."""
-    query = query.lower()
+def _keyword_terms(query):
+    """Return the theme and search terms matched by the built-in keywords."""
     search_terms = set()
     detected_theme = None
-
-    # First, try to match keywords for a quick response
     for theme, keywords in RECOMMENDATION_KEYWORDS.items():
         if theme in query or any(keyword in query for keyword in keywords):
             search_terms.update(keywords)
             detected_theme = theme  # Capture the theme
+    return detected_theme, search_terms
 
-    # If no keywords match, fall back to the AI model
-    if not search_terms:
-        print("...Thinking of some ideas for you...")
-        search_terms = get_ai_recommendations(query)
-        if not search_terms:
-            return "I'm sorry, I couldn't come up with any recommendations for that. Could you try being more specific?"
 
-    # Find unique products matching the search terms
+def _match_products(search_terms):
+    """Find up to 5 unique in-stock products matching the search terms."""
     recommended_products = pd.DataFrame()
     for term in set(search_terms):
         matches = inventory[
@@ -46,6 +40,39 @@ def recommend_products(query):
         recommended_products = pd.concat([recommended_products, matches])
 
     # Remove duplicates and limit to 5 suggestions
-    recommended_products = recommended_products.drop_duplicates(subset=["name"]).head(5)
+    return recommended_products.drop_duplicates(subset=["name"]).head(5)
+
+
+def recommend_products(query):
+    """Recommends products from inventory based on query keywords or AI suggestions."""
+    query = query.lower()
+
+    # First, try to match keywords for a quick response
+    detected_theme, search_terms = _keyword_terms(query)
+
+    # If no keywords match, fall back to the AI model
+    if not search_terms:
+        print("...Thinking of some ideas for you...")
+        search_terms = get_ai_recommendations(query)
+        if not search_terms:
+            return "I'm sorry, I couldn't come up with any recommendations for that. Could you try being more specific?"
+
+    return detected_theme, _match_products(search_terms)
+
+
+async def recommend_products_async(query):
+    """Async version of recommend_products that doesn't block on the AI fallback.
+
+    Always returns (theme, products); with no ideas at all that is
+    (None, an empty DataFrame) and the caller says so.
+    """
+    query = query.lower()
+    detected_theme, search_terms = _keyword_terms(query)
+
+    if not search_terms:
+        print("...Thinking of some ideas for you...")
+        search_terms = await get_ai_recommendations_async(query)
+        if not search_terms:
+            return None, pd.DataFrame()
 
-    return detected_theme, recommended_products
+    return detected_theme, await run_search(_match_products, search_terms)
@@ -1,11 +1,19 @@
+import asyncio
+
 import pandas as pd
-import difflib
 import json
 
 from .utils import sustainable_csv_path
+from .ingredient_names import clean_ingredient_names
+from .inventory_cache import get_store_inventory
+from .product_index import normalize_name
+from .search_service import run_store_search
 
 sustainable = pd.read_csv(sustainable_csv_path, encoding="utf-8-sig")
 
+# Lowest similarity a fuzzy candidate of a product name may have
+CANDIDATE_CUTOFF = 0.6
+
 # Category mapping for better search results
 CATEGORY_KEYWORDS = {
     "Fruits & Vegetables": [
@@ -149,22 +157,17 @@ def get_category_from_keywords(query):
 
 def search_by_category(category, inventory_csv_url, limit=10):
     """Search for products within a specific category."""
-    inventory = pd.read_csv(inventory_csv_url, encoding="utf-8-sig")
-    category_products = inventory[inventory["Category"] == category]
-    available_products = category_products[
-        (category_products["outOfStock"] == False)
-        & (category_products["availableQuantity"] > 0)
-    ]
+    store = get_store_inventory(inventory_csv_url)
+    view = store.categories.get(category)
 
-    if available_products.empty:
-        out_of_stock = category_products[category_products["outOfStock"] == True]
-        if not out_of_stock.empty:
+    if view is None or view.available_count == 0:
+        if view is not None and view.has_out_of_stock:
             return f"I found products in the {category} category, but they're currently out of stock. Please check back later!"
         else:
             return f"I'm sorry, we don't currently have any products in the {category} category."
 
     # Return top products from the category
-    top_products = available_products.head(limit)
+    top_products = store.rows(view.available_rows[:limit])
     product_list = []
     for _, row in top_products.iterrows():
         product_list.append(
@@ -175,13 +178,52 @@ def search_by_category(category, inventory_csv_url, limit=10):
         product_list
     )
 
-    if len(available_products) > limit:
-        response += f"\n\nI found {len(available_products)} total items in this category. Let me know if you're looking for something specific!"
+    if view.available_count > limit:
+        response += f"\n\nI found {view.available_count} total items in this category. Let me know if you're looking for something specific!"
 
     return response
 
 
-async def search_inventory(product_name, send, receive, inventory_csv_url):
+class ProductResult:
+    """Structured outcome of one product search.
+
+    ``status`` is "available", "out_of_stock", "not_found", "category" (the
+    search turned into a category listing) or "canceled". ``message`` is
+    the sentence search_inventory has always returned for it.
+    """
+
+    __slots__ = ("query", "status", "message", "name", "location", "quantity", "weight")
+
+    def __init__(self, query, status, message, row=None):
+        self.query = query
+        self.status = status
+        self.message = message
+        self.name = None if row is None else row["name"]
+        self.location = None if row is None else row["location"]
+        self.quantity = 0 if row is None else int(row["availableQuantity"])
+        self.weight = 0 if row is None else int(row["weightInGms"])
+
+    def __str__(self):
+        return self.message
+
+
+def _row_result(query, row, available_message):
+    if row["outOfStock"] or row["availableQuantity"] == 0:
+        return ProductResult(
+            query,
+            "out_of_stock",
+            f"I'm sorry, but {row['name']} is currently out of stock.",
+            row,
+        )
+    return ProductResult(query, "available", available_message, row)
+
+
+def _resolve_product(product_name, store, inventory_csv_url):
+    """Run the non-interactive part of a product search.
+
+    Returns a ProductResult, or the suggestion rows when the shopper has to
+    pick between several products.
+    """
     lower_name = product_name.lower()
 
     # First, check if this might be a category search
@@ -190,54 +232,177 @@ async def search_inventory(product_name, send, receive, inventory_csv_url):
     # If it's a general category search (like "household items"), show category results
     category_terms = ["items", "products", "things", "stuff", "goods"]
     if any(term in lower_name for term in category_terms) and detected_category:
-        return search_by_category(detected_category, inventory_csv_url)
+        return ProductResult(
+            product_name,
+            "category",
+            search_by_category(detected_category, inventory_csv_url),
+        )
 
     # Try exact match first
-    inventory = pd.read_csv(inventory_csv_url, encoding="utf-8-sig")
-    exact = inventory[inventory["name"].str.lower() == lower_name]
-    if not exact.empty:
-        row = exact.iloc[0]
-        if row["outOfStock"] or row["availableQuantity"] == 0:
-            return f"I'm sorry, but {row['name']} is currently out of stock."
-        else:
-            return (
-                f"Great news! We have {row['name']} in stock. "
-                f"You'll find it in {row['location']}, with {row['availableQuantity']} units available "
-                f"({row['weightInGms']}g total)."
-            )
+    inventory = store.frame
+    exact_row = store.index.lookup_exact(lower_name)
+    if exact_row is not None:
+        row = inventory.iloc[exact_row]
+        return _row_result(
+            product_name,
+            row,
+            f"Great news! We have {row['name']} in stock. "
+            f"You'll find it in {row['location']}, with {row['availableQuantity']} units available "
+            f"({row['weightInGms']}g total).",
+        )
 
     # No exact match: gather suggestions
-    substr = inventory[inventory["name"].str.lower().str.contains(lower_name)]
-    if not substr.empty:
-        suggestions = substr.head(5)
+    substr_rows = store.index.substring_rows(lower_name, limit=5)
+    if substr_rows:
+        suggestions = store.rows(substr_rows)
     else:
         # If no substring match and we detected a category, search within that category
         if detected_category:
-            category_results = search_by_category(detected_category, 5)
-            return f"I couldn't find '{product_name}' specifically, but here are some {detected_category.lower()} options:\n\n{category_results}"
+            category_results = search_by_category(detected_category, inventory_csv_url, 5)
+            return ProductResult(
+                product_name,
+                "category",
+                f"I couldn't find '{product_name}' specifically, but here are some {detected_category.lower()} options:\n\n{category_results}",
+            )
 
         # Fuzzy match suggestions
-        names = inventory["name"].tolist()
-        close = difflib.get_close_matches(product_name, names, n=5, cutoff=0.6)
-        suggestions = inventory[inventory["name"].isin(close)]
+        close_rows = store.matcher.close_matches(product_name, n=5, cutoff=CANDIDATE_CUTOFF)
+        suggestions = store.rows(close_rows)
 
     if suggestions.empty:
         # Last resort: if we detected a category, show category items
         if detected_category:
-            return f"I couldn't find '{product_name}' specifically, but let me show you our {detected_category.lower()} section:\n\n{search_by_category(detected_category, 5)}"
-        return f"I'm sorry, I couldn't find '{product_name}' in our inventory."
+            return ProductResult(
+                product_name,
+                "category",
+                f"I couldn't find '{product_name}' specifically, but let me show you our {detected_category.lower()} section:\n\n{search_by_category(detected_category, inventory_csv_url, 5)}",
+            )
+        return ProductResult(
+            product_name,
+            "not_found",
+            f"I'm sorry, I couldn't find '{product_name}' in our inventory.",
+        )
 
     # If only one suggestion, return its status
     if len(suggestions) == 1:
         row = suggestions.iloc[0]
-        if row["outOfStock"] or row["availableQuantity"] == 0:
-            return f"I'm sorry, but {row['name']} is currently out of stock."
-        else:
-            return (
-                f"I found '{row['name']}', and it's available! "
-                f"Check aisle {row['location']} — we have {row['availableQuantity']} units "
-                f"({row['weightInGms']}g total)."
+        return _row_result(
+            product_name,
+            row,
+            f"I found '{row['name']}', and it's available! "
+            f"Check aisle {row['location']} — we have {row['availableQuantity']} units "
+            f"({row['weightInGms']}g total).",
+        )
+
+    return suggestions
+
+
+class ProductLookup:
+    """A product search resolved ahead of the conversation, e.g. speculatively.
+
+    Holds either the final ``result`` or the ``suggestions`` to offer, and
+    the store load and version it was computed against so a stale lookup
+    can be recognised and redone. Lookups are small enough to be sent back
+    from a worker process.
+    """
+
+    __slots__ = ("product_name", "content_hash", "version", "result", "suggestions")
+
+    def __init__(self, product_name, store, outcome):
+        self.product_name = product_name
+        self.content_hash = store.content_hash
+        self.version = store.version
+        self.result = outcome if isinstance(outcome, ProductResult) else None
+        self.suggestions = None if self.result is not None else outcome
+
+    def __getstate__(self):
+        state = {name: getattr(self, name) for name in self.__slots__}
+        if self.suggestions is not None:
+            # Don't pickle every category of the store along with five rows
+            state["suggestions"] = self.suggestions.astype(
+                {
+                    column: object
+                    for column, dtype in self.suggestions.dtypes.items()
+                    if isinstance(dtype, pd.CategoricalDtype)
+                }
             )
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def is_current(self, store):
+        return self.content_hash == store.content_hash and self.version == store.version
+
+
+def lookup_product(product_name, inventory_csv_url):
+    """Resolve a product against the store without talking to the shopper."""
+    store = get_store_inventory(inventory_csv_url)
+    return ProductLookup(
+        product_name, store, _resolve_product(product_name, store, inventory_csv_url)
+    )
+
+
+def _current_or_lookup(product_name, inventory_csv_url, lookup=None):
+    """Return ``lookup`` if it is for this product and the store's current state, else redo it.
+
+    Runs in the SearchService, so fetching (or revalidating) the store never
+    happens on the event loop.
+    """
+    store = get_store_inventory(inventory_csv_url)
+    if (
+        lookup is not None
+        and normalize_name(lookup.product_name) == normalize_name(product_name)
+        and lookup.is_current(store)
+    ):
+        return lookup
+    return ProductLookup(
+        product_name, store, _resolve_product(product_name, store, inventory_csv_url)
+    )
+
+
+async def lookup_products_async(products, inventory_csv_url, lookups=None):
+    """Resolve several products concurrently through the SearchService.
+
+    Returns a dict of ProductLookups keyed by product name. Current entries
+    of ``lookups`` (e.g. speculative ones) are reused instead of redone;
+    names are matched the way the index matches them, so "Onion" reuses
+    a lookup made for "onion".
+    """
+    known = {normalize_name(name): lookup for name, lookup in (lookups or {}).items()}
+    pending = {normalize_name(product): product for product in products if product}
+    resolved = await asyncio.gather(
+        *(
+            run_store_search(
+                inventory_csv_url,
+                _current_or_lookup,
+                product,
+                inventory_csv_url,
+                known.get(name),
+            )
+            for name, product in pending.items()
+        )
+    )
+    known.update(zip(pending, resolved))
+    return {product: known[normalize_name(product)] for product in products if product}
+
+
+async def search_inventory_result(
+    product_name, send, receive, inventory_csv_url, lookup=None
+):
+    """Search the inventory for one product and return a ProductResult.
+
+    When several products match, the shopper is asked to pick one. A
+    ``lookup`` from lookup_product for the same name is reused if the store
+    hasn't changed since.
+    """
+    lookup = await run_store_search(
+        inventory_csv_url, _current_or_lookup, product_name, inventory_csv_url, lookup
+    )
+    if lookup.result is not None:
+        return lookup.result
+    suggestions = lookup.suggestions
 
     # Multiple suggestions: prompt user to choose
     options_text = f"I found multiple products matching '{product_name}'. Here are your top {len(suggestions)} options:\n\n"
@@ -264,7 +429,11 @@ async def search_inventory(product_name, send, receive, inventory_csv_url):
                 continue
 
             if choice_input.lower() == "cancel":
-                return "Selection canceled. Let me know if there is anything else I can help with!"
+                return ProductResult(
+                    product_name,
+                    "canceled",
+                    "Selection canceled. Let me know if there is anything else I can help with!",
+                )
 
             try:
                 choice = int(choice_input)
@@ -287,13 +456,12 @@ async def search_inventory(product_name, send, receive, inventory_csv_url):
                 continue
 
             row = suggestions.iloc[choice - 1]
-            if row["outOfStock"] or row["availableQuantity"] == 0:
-                return f"I'm sorry, but {row['name']} is currently out of stock."
-            else:
-                return (
-                    f"Great choice! {row['name']} is in aisle {row['location']} with {row['availableQuantity']} units "
-                    f"({row['weightInGms']}g total) ready for you."
-                )
+            return _row_result(
+                product_name,
+                row,
+                f"Great choice! {row['name']} is in aisle {row['location']} with {row['availableQuantity']} units "
+                f"({row['weightInGms']}g total) ready for you.",
+            )
         except ValueError:
             await send(json.dumps(
                 {
@@ -303,6 +471,11 @@ async def search_inventory(product_name, send, receive, inventory_csv_url):
             ))
 
 
+async def search_inventory(product_name, send, receive, inventory_csv_url):
+    result = await search_inventory_result(product_name, send, receive, inventory_csv_url)
+    return result.message
+
+
 def suggest_sustainable(product_name):
     match = sustainable[
         sustainable["Original Product"].str.lower().str.contains(product_name.lower())
@@ -316,67 +489,156 @@ def suggest_sustainable(product_name):
     return None
 
 
-def search_inventory_quick(product_name, inventory_csv_url):
-    """Non-interactive version of search_inventory for batch ingredient checking."""
-    lower_name = product_name.lower()
-
-    # Try exact match first
-    inventory = pd.read_csv(inventory_csv_url, encoding="utf-8-sig")
-    exact = inventory[inventory["name"].str.lower() == lower_name]
-    if not exact.empty:
-        row = exact.iloc[0]
+def _quick_result(row, row_id, status, match, message):
+    if row is None:
+        return {
+            "status": status,
+            "match": match,
+            "message": message,
+            "row": None,
+            "name": None,
+            "location": None,
+            "quantity": 0,
+        }
+    return {
+        "status": status,
+        "match": match,
+        "message": message,
+        "row": row_id,
+        "name": row["name"],
+        "location": row["location"],
+        "quantity": int(row["availableQuantity"]),
+    }
+
+
+def candidate_rows(store, product_name):
+    """Return the store rows a product name refers to, and whether the match is exact.
+
+    An exact name match gives that one row; otherwise up to 3 rows whose
+    name contains it, or failing that up to 3 fuzzy matches.
+    """
+    state = store.state
+    exact_row = state.index.lookup_exact(product_name.lower())
+    if exact_row is not None:
+        return [exact_row], True
+    rows = state.index.substring_rows(product_name.lower(), limit=3)
+    if not rows:
+        rows = state.matcher.close_matches(product_name, n=3, cutoff=CANDIDATE_CUTOFF)
+    return rows, False
+
+
+def _quick_status(store, suggestion_rows, exact):
+    """Report the stock of the candidate rows of a product name."""
+    inventory = store.frame
+
+    if exact:
+        exact_row = suggestion_rows[0]
+        row = inventory.iloc[exact_row]
         if row["outOfStock"] or row["availableQuantity"] == 0:
-            return f"Out of stock"
+            return _quick_result(row, exact_row, "out_of_stock", "exact", "Out of stock")
         else:
-            return f"Available in {row['location']} ({row['availableQuantity']} units)"
-
-    # No exact match: gather suggestions
-    substr = inventory[inventory["name"].str.lower().str.contains(lower_name)]
-    if not substr.empty:
-        suggestions = substr.head(3)  # Take top 3 for quick check
-    else:
-        # Fuzzy match suggestions
-        names = inventory["name"].tolist()
-        close = difflib.get_close_matches(product_name, names, n=3, cutoff=0.6)
-        suggestions = inventory[inventory["name"].isin(close)]
+            return _quick_result(
+                row,
+                exact_row,
+                "available",
+                "exact",
+                f"Available in {row['location']} ({row['availableQuantity']} units)",
+            )
 
-    if suggestions.empty:
-        return f"Not found in inventory"
+    if not suggestion_rows:
+        return _quick_result(None, None, "not_found", None, "Not found in inventory")
 
     # If only one suggestion, return its status
-    if len(suggestions) == 1:
-        row = suggestions.iloc[0]
+    if len(suggestion_rows) == 1:
+        row = inventory.iloc[suggestion_rows[0]]
         if row["outOfStock"] or row["availableQuantity"] == 0:
-            return f"'{row['name']}' - Out of stock"
+            return _quick_result(
+                row,
+                suggestion_rows[0],
+                "out_of_stock",
+                "similar",
+                f"'{row['name']}' - Out of stock",
+            )
         else:
-            return f"'{row['name']}' - Available in {row['location']}"
+            return _quick_result(
+                row,
+                suggestion_rows[0],
+                "available",
+                "similar",
+                f"'{row['name']}' - Available in {row['location']}",
+            )
 
     # Multiple suggestions: return the first available one
-    for _, row in suggestions.iterrows():
+    for row_id in suggestion_rows:
+        row = inventory.iloc[row_id]
         if not row["outOfStock"] and row["availableQuantity"] > 0:
-            return f"Similar item '{row['name']}' - Available in {row['location']}"
+            return _quick_result(
+                row,
+                row_id,
+                "available",
+                "similar",
+                f"Similar item '{row['name']}' - Available in {row['location']}",
+            )
 
     # All suggestions are out of stock
-    return f"Multiple similar items found but all out of stock"
+    return _quick_result(
+        inventory.iloc[suggestion_rows[0]],
+        suggestion_rows[0],
+        "out_of_stock",
+        "similar",
+        "Multiple similar items found but all out of stock",
+    )
+
+
+def _lookup_quick(store, product_name):
+    """Resolve one product name against a store without any interaction."""
+    # Try exact match first, then gather suggestions (top 3 for quick check)
+    return _quick_status(store, *candidate_rows(store, product_name))
+
+
+def search_inventory_quick(product_name, inventory_csv_url):
+    """Non-interactive version of search_inventory for batch ingredient checking."""
+    store = get_store_inventory(inventory_csv_url)
+    return _lookup_quick(store, product_name)["message"]
+
+
+def check_availability_batch(ingredients, inventory_csv_url, sku_map=None):
+    """Check a dish's ingredient list against the store inventory in one pass.
+
+    All names are cleaned together, the store is fetched once and repeated
+    names are resolved once. With an IngredientSkuMap for the store, known
+    ingredients are cleaned and resolved by dict probes instead. Returns one dict per ingredient, in order, with
+    the ``ingredient``, the cleaned ``query``, a ``status`` ("available",
+    "out_of_stock" or "not_found"), whether the ``match`` was exact or
+    similar, the matched ``row``, ``name``, ``location`` and ``quantity``,
+    and the ``message`` search_inventory_quick would have returned.
+    """
+    if sku_map is not None:
+        store = sku_map.store
+        queries = sku_map.canonical_names(ingredients)
+        resolved = {
+            query: _quick_status(store, *sku_map.candidate_rows(query))
+            for query in dict.fromkeys(queries)
+        }
+    else:
+        store = get_store_inventory(inventory_csv_url)
+        queries = clean_ingredient_names(ingredients)
+        resolved = {query: _lookup_quick(store, query) for query in dict.fromkeys(queries)}
+    return [
+        dict(resolved[query], ingredient=ingredient, query=query)
+        for ingredient, query in zip(ingredients, queries)
+    ]
 
 
 def list_all_categories(inventory_csv_url):
     """List all available product categories."""
-    inventory = pd.read_csv(inventory_csv_url, encoding="utf-8-sig")
-    categories = inventory["Category"].unique()
+    store = get_store_inventory(inventory_csv_url)
     available_categories = []
 
-    for category in categories:
-        category_count = len(
-            inventory[
-                (inventory["Category"] == category)
-                & (inventory["outOfStock"] == False)
-                & (inventory["availableQuantity"] > 0)
-            ]
-        )
-        if category_count > 0:
+    for view in store.categories:
+        if view.available_count > 0:
             available_categories.append(
-                f"• {category} ({category_count} items available)"
+                f"• {view.name} ({view.available_count} items available)"
             )
 
     if available_categories:
@@ -1,53 +1,72 @@
-import pandas as pd
+import asyncio
 import requests
+import httpx
 import json
 from bs4 import BeautifulSoup
-from .llm_utils import format_recipe_response, format_dish_ingredients_response
+from .llm_utils import (
+    format_recipe_response_async,
+    format_dish_ingredients_response_async,
+    get_async_client,
+)
 from .audio_utils import speak
-from .product_search import search_inventory, search_inventory_quick
+from .ingredient_names import clean_ingredient_name
+from .ingredient_map import IngredientSkuMaps
+from .product_search import search_inventory, check_availability_batch
+from .search_service import run_search, run_store_search
+from .recipe_ranking import RECIPE_RANKING, IngredientCoverage
+from .recipe_store import RecipeStore
+from .utils import recipes_csv_path
+
+# Load the local recipe dataset (names, ratings and parsed ingredients only)
+recipes = RecipeStore.load(recipes_csv_path)
+coverage = IngredientCoverage(recipes)
+# Per-store canonical ingredient name -> SKU tables over the recipe vocabulary
+sku_maps = IngredientSkuMaps(recipes.vocab)
+
+
+def recipe_scores(inventory_csv_url):
+    """Return every recipe's in-stock ingredient share at a store, or None to rank by rating."""
+    if RECIPE_RANKING != "coverage" or not inventory_csv_url or recipes.empty:
+        return None
+    return coverage.scores(sku_maps.get(inventory_csv_url))
+
 
-# Load the local recipe dataset
-try:
-    recipes_df = pd.read_csv("../data/recipes.csv")
-except FileNotFoundError:
-    recipes_df = pd.DataFrame()
+def check_ingredient_availability(ingredients, inventory_csv_url):
+    """Check a dish's ingredients against a store through its ingredient table."""
+    return check_availability_batch(
+        ingredients, inventory_csv_url, sku_maps.get(inventory_csv_url)
+    )
 
 
-def find_recipes_by_ingredient(products):
+def find_recipes_by_ingredient(products, inventory_csv_url=None):
     """Finds top 5 recipes from the local CSV based on a list of ingredients."""
-    if recipes_df.empty:
+    if recipes.empty:
         return []
 
     if isinstance(products, str):
         products = [products]
 
-    matching_recipes = recipes_df.copy()
-    for product in products:
-        matching_recipes = matching_recipes[
-            matching_recipes["RecipeIngredientParts"]
-            .str.lower()
-            .str.contains(product.lower())
-        ]
-
-    if matching_recipes.empty:
-        return []
-
-    # Sort by reviews and return the top 5 dish names
-    top_recipes = matching_recipes.sort_values(
-        by="AggregatedRating", ascending=False
-    ).head(5)
-    return top_recipes["Name"].tolist()
+    # Recipes containing every ingredient from the inverted index, the ones
+    # the store can cover best first, then the best rated
+    rows = recipes.ingredient_index.search(
+        products, limit=5, scores=recipe_scores(inventory_csv_url)
+    )
+    return [recipes.names[row] for row in rows]
 
 
 def get_recipe_details(dish_name):
     """Gets the full details for a chosen dish from the local CSV."""
-    if recipes_df.empty:
+    if recipes.empty:
         return None
 
-    match = recipes_df[recipes_df["Name"].str.lower() == dish_name.lower()]
-    if not match.empty:
-        return match.iloc[0].to_dict()
-    return None
+    row = recipes.dish_index.lookup_exact(dish_name)
+    if row is None:
+        return None
+    return recipes.details(row)
+
+
+MEALDB_FILTER_URL = "https://www.themealdb.com/api/json/v1/1/filter.php"
+MEALDB_SEARCH_URL = "https://www.themealdb.com/api/json/v1/1/search.php"
 
 
 def get_recipe_from_api(products):
@@ -58,7 +77,7 @@ def get_recipe_from_api(products):
     # TheMealDB API for filtering by main ingredient
     # We will use the first product as the main ingredient for the query
     query = products[0]
-    url = f"https://www.themealdb.com/api/json/v1/1/filter.php?i={query}"
+    url = f"{MEALDB_FILTER_URL}?i={query}"
 
     try:
         r = requests.get(url)
@@ -78,7 +97,45 @@ def get_recipe_from_api(products):
         return []
 
 
-async def handle_recipe_search(products_to_process, send, receive, input_method="text"):
+async def _get_meals_with_ingredient(ingredient):
+    """Return the names of all TheMealDB meals that use an ingredient."""
+    try:
+        r = await get_async_client().get(MEALDB_FILTER_URL, params={"i": ingredient})
+        r.raise_for_status()
+        data = r.json()
+        return [meal["strMeal"] for meal in data.get("meals") or []]
+    except httpx.HTTPError as e:
+        print(f"API Error: {e}")
+        return []
+    except ValueError:
+        print("API Error: Could not decode JSON response.")
+        return []
+
+
+async def get_recipe_from_api_async(products, limit=3):
+    """Query TheMealDB for every ingredient concurrently and merge the results.
+
+    Meals using more of the ingredients come first; ties keep the order of
+    the ingredients and of the API's own results. For a single ingredient
+    this returns the same names as get_recipe_from_api.
+    """
+    if isinstance(products, str):
+        products = [products]
+
+    meal_lists = await asyncio.gather(
+        *(_get_meals_with_ingredient(product) for product in products)
+    )
+    counts = {}
+    for meals in meal_lists:
+        for meal in dict.fromkeys(meals):
+            counts[meal] = counts.get(meal, 0) + 1
+    # sorted() is stable, so equal counts stay in first-seen order
+    return sorted(counts, key=lambda meal: -counts[meal])[:limit]
+
+
+async def handle_recipe_search(
+    products_to_process, send, receive, inventory_csv_url=None, input_method="text", on_delta=None
+):
 
     def speak_wrapper(text):
         if input_method == "voice":
@@ -98,11 +155,19 @@ async def handle_recipe_search(products_to_process, send, receive, input_method=
     product_names = ", ".join(valid_products)
     # speak_wrapper(f"Searching for recipes with '{product_names}'...")
     await send(json.dumps({"message":f"Searching for recipes with '{product_names}'..."}))
-    local_recipes = find_recipes_by_ingredient(valid_products)
+    if inventory_csv_url:
+        local_recipes = await run_store_search(
+            inventory_csv_url, find_recipes_by_ingredient, valid_products, inventory_csv_url
+        )
+    else:
+        local_recipes = await run_search(find_recipes_by_ingredient, valid_products)
 
     if local_recipes:
 
-        recipe_text = f"Found {len(local_recipes)} recipes! Here are your top choices based on reviews:\n\n"
+        basis = "reviews"
+        if RECIPE_RANKING == "coverage" and inventory_csv_url:
+            basis = "what's in stock and reviews"
+        recipe_text = f"Found {len(local_recipes)} recipes! Here are your top choices based on {basis}:\n\n"
         for i, dish in enumerate(local_recipes, 1):
             recipe_text += f"{i}. {dish}\n"
 
@@ -141,9 +206,11 @@ async def handle_recipe_search(products_to_process, send, receive, input_method=
                 await send(json.dumps({"message":f"Great choice! Fetching the recipe for {chosen_dish}..."}))
 
                 # Step 3: Get details and format with LLM
-                details = get_recipe_details(chosen_dish)
+                details = await run_search(get_recipe_details, chosen_dish)
                 if details:
-                    formatted_recipe = format_recipe_response(details)
+                    formatted_recipe = await format_recipe_response_async(
+                        details, on_delta=on_delta
+                    )
                     # speak_wrapper(formatted_recipe)
                     await send(json.dumps({"message":formatted_recipe}))
                 else:
@@ -176,7 +243,7 @@ async def handle_recipe_search(products_to_process, send, receive, input_method=
         await send(json.dumps({"message":
             f"I couldn't find any recipes for '{product_names}' in our cookbook. Let me check online..."
         }))
-        api_recipes = get_recipe_from_api(valid_products)
+        api_recipes = await get_recipe_from_api_async(valid_products)
         if api_recipes:
             # speak_wrapper(f"Here are some online recipes for '{product_names}':")
             await send(json.dumps({"message":f"Here are some online recipes for '{product_names}':"}))
@@ -191,75 +258,56 @@ async def handle_recipe_search(products_to_process, send, receive, input_method=
             }))
 
 
-def get_dish_ingredients_from_local(dish_name):
+def get_dish_ingredients_from_local(dish_name, inventory_csv_url=None):
     """Gets ingredients for a dish from the local CSV dataset."""
-    if recipes_df.empty:
+    if recipes.empty:
         return None
 
-    match = recipes_df[recipes_df["Name"].str.lower().str.contains(dish_name.lower())]
-    if not match.empty:
-        # Get the best match (highest rated)
-        best_match = match.sort_values(by="AggregatedRating", ascending=False).iloc[0]
-        ingredients = best_match["RecipeIngredientParts"]
+    # Get the best match (best in-stock coverage, then highest rated);
+    # ingredients were parsed at load time
+    best_row = recipes.dish_index.best_match(dish_name, recipe_scores(inventory_csv_url))
+    if best_row is None:
+        return None
+    return {
+        "dish_name": recipes.names[best_row],
+        "ingredients": recipes.ingredients(best_row),
+        "rating": recipes.rating(best_row),
+    }
+
+
+def _dish_info_from_search(data):
+    """Return the first meal of a TheMealDB search response as dish info, or None."""
+    if data.get("meals") and len(data["meals"]) > 0:
+        meal = data["meals"][0]
+        ingredients = []
+
+        # Extract ingredients from the API response
+        for i in range(1, 21):  # TheMealDB has up to 20 ingredients
+            ingredient = meal.get(f"strIngredient{i}")
+            measure = meal.get(f"strMeasure{i}")
+
+            if ingredient and ingredient.strip():
+                if measure and measure.strip():
+                    ingredients.append(f"{measure.strip()} {ingredient.strip()}")
+                else:
+                    ingredients.append(ingredient.strip())
 
-        # Parse ingredients (they're stored as a string representation of a list)
-        try:
-            import ast
-
-            if isinstance(ingredients, str) and ingredients.startswith("c("):
-                # Handle the specific format in the CSV
-                ingredients_str = ingredients[2:-1]  # Remove 'c(' and ')'
-                ingredients_list = [
-                    ing.strip('"') for ing in ingredients_str.split('", "')
-                ]
-            else:
-                ingredients_list = (
-                    ast.literal_eval(ingredients)
-                    if isinstance(ingredients, str)
-                    else ingredients
-                )
-
-            return {
-                "dish_name": best_match["Name"],
-                "ingredients": ingredients_list,
-                "rating": best_match["AggregatedRating"],
-            }
-        except Exception as e:
-            print(f"Error parsing ingredients: {e}")
-            return None
+        return {
+            "dish_name": meal["strMeal"],
+            "ingredients": ingredients,
+            "instructions": meal.get("strInstructions", ""),
+        }
     return None
 
 
 def get_dish_ingredients_from_api(dish_name):
     """Gets ingredients for a dish from TheMealDB API as a fallback."""
-    url = f"https://www.themealdb.com/api/json/v1/1/search.php?s={dish_name}"
+    url = f"{MEALDB_SEARCH_URL}?s={dish_name}"
 
     try:
         response = requests.get(url)
         response.raise_for_status()
-        data = response.json()
-
-        if data.get("meals") and len(data["meals"]) > 0:
-            meal = data["meals"][0]
-            ingredients = []
-
-            # Extract ingredients from the API response
-            for i in range(1, 21):  # TheMealDB has up to 20 ingredients
-                ingredient = meal.get(f"strIngredient{i}")
-                measure = meal.get(f"strMeasure{i}")
-
-                if ingredient and ingredient.strip():
-                    if measure and measure.strip():
-                        ingredients.append(f"{measure.strip()} {ingredient.strip()}")
-                    else:
-                        ingredients.append(ingredient.strip())
-
-            return {
-                "dish_name": meal["strMeal"],
-                "ingredients": ingredients,
-                "instructions": meal.get("strInstructions", ""),
-            }
-        return None
+        return _dish_info_from_search(response.json())
     except requests.exceptions.RequestException as e:
         print(f"API Error: {e}")
         return None
@@ -268,8 +316,22 @@ def get_dish_ingredients_from_api(dish_name):
         return None
 
 
+async def get_dish_ingredients_from_api_async(dish_name):
+    """Async get_dish_ingredients_from_api on the shared httpx client."""
+    try:
+        r = await get_async_client().get(MEALDB_SEARCH_URL, params={"s": dish_name})
+        r.raise_for_status()
+        return _dish_info_from_search(r.json())
+    except httpx.HTTPError as e:
+        print(f"API Error: {e}")
+        return None
+    except ValueError:
+        print("API Error: Could not decode JSON response.")
+        return None
+
+
 async def handle_dish_ingredients_search(
-    dish_name, send, receive, inventory_csv_url, input_method="text"
+    dish_name, send, receive, inventory_csv_url, input_method="text", on_delta=None
 ):
     """Main function to handle dish ingredients search and inventory check."""
 
@@ -281,7 +343,9 @@ async def handle_dish_ingredients_search(
     await send(json.dumps({"message":f"Let me find the ingredients needed for {dish_name}..."}))
 
     # Step 1: Try to get ingredients from local database
-    local_dish_info = get_dish_ingredients_from_local(dish_name)
+    local_dish_info = await run_store_search(
+        inventory_csv_url, get_dish_ingredients_from_local, dish_name, inventory_csv_url
+    )
 
     if local_dish_info:
         # speak_wrapper(f"Found {local_dish_info['dish_name']} in our recipe database!")
@@ -292,7 +356,7 @@ async def handle_dish_ingredients_search(
         # Step 2: Fallback to API
         # speak_wrapper(f"Let me check online for {dish_name} ingredients...")
         await send(json.dumps({"message":f"Let me check online for {dish_name} ingredients..."}))
-        api_dish_info = get_dish_ingredients_from_api(dish_name)
+        api_dish_info = await get_dish_ingredients_from_api_async(dish_name)
 
         if api_dish_info:
             # speak_wrapper(f"Found {api_dish_info['dish_name']} online!")
@@ -339,22 +403,21 @@ async def handle_dish_ingredients_search(
             available_items = []
             unavailable_items = []
 
-            for ingredient in ingredients:
-                # Clean up ingredient name (remove measurements and extra words)
-                clean_ingredient = clean_ingredient_name(ingredient)
-                result = search_inventory_quick(clean_ingredient, inventory_csv_url)
+            # Resolve every ingredient through the store's ingredient table
+            # in one batch, off the event loop
+            availability = await run_store_search(
+                inventory_csv_url, check_ingredient_availability, ingredients, inventory_csv_url
+            )
+            for result in availability:
+                ingredient = result["ingredient"]
 
                 # Format the result for display
-                if (
-                    "available" in result.lower()
-                    and "out of stock" not in result.lower()
-                ):
+                if result["status"] == "available":
                     available_count += 1
                     available_items.append(ingredient)
-                    ingredients_info.append(f" {ingredient}: {result}")
                 else:
                     unavailable_items.append(ingredient)
-                    ingredients_info.append(f" {ingredient}: {result}")
+                ingredients_info.append(f" {ingredient}: {result['message']}")
 
             # # Show compact summary
             # print(
@@ -367,8 +430,8 @@ async def handle_dish_ingredients_search(
             #     print(f"Need to find: {', '.join(unavailable_items)}")
 
             # Step 6: Format response with LLM for a natural summary
-            formatted_response = format_dish_ingredients_response(
-                final_dish_name, ingredients_info
+            formatted_response = await format_dish_ingredients_response_async(
+                final_dish_name, ingredients_info, on_delta=on_delta
             )
             await send(json.dumps({"message":f"\n💬 {formatted_response}"}))
             # speak_wrapper(formatted_response)
@@ -384,54 +447,3 @@ async def handle_dish_ingredients_search(
             break
         else:
             await send(json.dumps({"message":"Please answer with 'yes' or 'no'."}))
-
-
-def clean_ingredient_name(ingredient):
-    """Clean ingredient name to make it suitable for inventory search."""
-    # Remove common measurements and extra words
-    import re
-
-    # Remove measurements like "1 cup", "2 tbsp", etc.
-    ingredient = re.sub(
-        r"^\d+[\d\s/]*\s*(cup|cups|tbsp|tsp|tablespoon|tablespoons|teaspoon|teaspoons|lb|lbs|oz|ounce|ounces|pound|pounds|g|grams|kg|kilogram|kilograms|ml|liter|liters)\s*",
-        "",
-        ingredient,
-        flags=re.IGNORECASE,
-    )
-
-    # Remove common adjectives and descriptors
-    words_to_remove = [
-        "fresh",
-        "dried",
-        "chopped",
-        "diced",
-        "sliced",
-        "minced",
-        "ground",
-        "whole",
-        "large",
-        "small",
-        "medium",
-        "organic",
-        "extra",
-        "virgin",
-        "all-purpose",
-        "unsalted",
-        "boneless",
-        "skinless",
-    ]
-
-    for word in words_to_remove:
-        ingredient = re.sub(r"\b" + word + r"\b", "", ingredient, flags=re.IGNORECASE)
-
-    # Clean up extra spaces and return the first significant word(s)
-    ingredient = re.sub(r"\s+", " ", ingredient).strip()
-
-    # Take the first 1-2 words as the main ingredient
-    words = ingredient.split()
-    if len(words) >= 2:
-        return " ".join(words[:2])
-    elif len(words) == 1:
-        return words[0]
-    else:
-        return ingredient
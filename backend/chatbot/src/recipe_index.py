@@ -0,0 +1,161 @@
+import re
+
+import numpy as np
+
+from .product_index import ProductIndex, normalize_name
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def _by_score(ranks, row_ids, scores):
+    """Reorder ranks by descending score of their rows; equal scores keep rank order."""
+    return ranks[np.argsort(-scores[row_ids[ranks]], kind="stable")]
+
+
+def rating_order(ratings):
+    """Return row ids from best to worst rated; unrated rows last, ties in row order."""
+    ratings = np.asarray(ratings, dtype=float)
+    return np.argsort(np.nan_to_num(-ratings, nan=np.inf), kind="stable").astype(np.int32)
+
+
+class RecipeIngredientIndex:
+    """Inverted index from ingredient-text token to recipes, best rated first.
+
+    Recipes are numbered by rank (0 is the highest AggregatedRating, unrated
+    recipes last, ties in row order) and every posting list is a sorted
+    array of ranks, stored back to back (CSR layout). A search intersects
+    the postings of its words and walks the survivors in rank order,
+    verifying the full terms, until it has enough.
+
+    Matching is the same case-insensitive substring test as before: a term
+    matches a recipe whose ingredient text contains it anywhere, so "egg"
+    finds "eggs" and "eggplant". Each word of a term is looked up in every
+    token that contains it, which keeps the candidates a superset of the
+    true matches. Those tokens come from a trigram ProductIndex over the
+    vocabulary, or for words shorter than a trigram from a table of every
+    token's one- and two-letter substrings, so no query scans the vocabulary.
+    """
+
+    def __init__(self, ingredient_texts, ratings):
+        texts = ["" if not isinstance(text, str) else text.lower() for text in ingredient_texts]
+        self.row_ids = rating_order(ratings)
+        self.texts = [texts[row] for row in self.row_ids]
+
+        postings = {}
+        for rank, text in enumerate(self.texts):
+            for token in set(TOKEN_PATTERN.findall(text)):
+                postings.setdefault(token, []).append(rank)
+
+        self.vocab = list(postings)
+        lengths = np.fromiter(
+            (len(ranks) for ranks in postings.values()), dtype=np.int64, count=len(postings)
+        )
+        self.offsets = np.zeros(len(postings) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self.offsets[1:])
+        self.postings = np.fromiter(
+            (rank for ranks in postings.values() for rank in ranks),
+            dtype=np.int32,
+            count=int(self.offsets[-1]),
+        )
+        self.tokens = ProductIndex(self.vocab, normalized=True)
+        self.short_tokens = {}
+        for token_id, token in enumerate(self.vocab):
+            substrings = {
+                token[i : i + size] for size in (1, 2) for i in range(len(token) - size + 1)
+            }
+            for substring in substrings:
+                self.short_tokens.setdefault(substring, []).append(token_id)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def _posting(self, token_id):
+        return self.postings[self.offsets[token_id] : self.offsets[token_id + 1]]
+
+    def word_ranks(self, word):
+        """Return the sorted ranks of recipes with a token containing the word."""
+        if len(word) < 3:
+            token_ids = self.short_tokens.get(word, [])
+        else:
+            token_ids = self.tokens.substring_rows(word)
+        lists = [self._posting(token_id) for token_id in token_ids]
+        if not lists:
+            return self.postings[:0]
+        if len(lists) == 1:
+            return lists[0]
+        return np.unique(np.concatenate(lists))
+
+    def search(self, terms, limit=5, scores=None):
+        """Return the row ids of the best-rated recipes containing every term.
+
+        With per-row ``scores`` (e.g. in-stock coverage) the highest scores
+        come first instead, best rated first among equal scores.
+        """
+        terms = [term.lower() for term in terms]
+        words = {word for term in terms for word in TOKEN_PATTERN.findall(term)}
+
+        candidates = None
+        # Longer words match fewer tokens, so start with them
+        for word in sorted(words, key=len, reverse=True):
+            ranks = self.word_ranks(word)
+            if candidates is None:
+                candidates = ranks
+            else:
+                candidates = np.intersect1d(candidates, ranks, assume_unique=True)
+            if not len(candidates):
+                return []
+
+        if scores is not None:
+            if candidates is None:
+                candidates = np.arange(len(self.texts))
+            candidates = _by_score(candidates, self.row_ids, scores)
+
+        rows = []
+        for rank in range(len(self.texts)) if candidates is None else candidates.tolist():
+            text = self.texts[rank]
+            if all(term in text for term in terms):
+                rows.append(int(self.row_ids[rank]))
+                if len(rows) >= limit:
+                    break
+        return rows
+
+
+class DishNameIndex:
+    """Exact and substring lookup of recipe names, best rated first.
+
+    Exact names are a dict probe (the first recipe in file order wins, as
+    before). Substring lookups use a trigram ProductIndex built over the
+    names in rating order, so the first verified candidate is already the
+    best-rated recipe whose name contains the query.
+    """
+
+    def __init__(self, names, ratings):
+        self.row_ids = rating_order(ratings)
+        self.exact = {}
+        for row, name in enumerate(names):
+            self.exact.setdefault(normalize_name(name), row)
+        self.names = ProductIndex([names[row] for row in self.row_ids])
+
+    def __len__(self):
+        return len(self.row_ids)
+
+    def lookup_exact(self, name):
+        """Return the row of the recipe with exactly this name, or None."""
+        return self.exact.get(normalize_name(name))
+
+    def best_match(self, query, scores=None):
+        """Return the row of the best-rated recipe whose name contains the query, or None.
+
+        With per-row ``scores`` the highest-scoring such recipe wins, the
+        best rated among equal scores.
+        """
+        if scores is None:
+            ranks = self.names.substring_rows(query, limit=1)
+        else:
+            query = normalize_name(query)
+            candidates = self.names.substring_candidates(query)
+            if candidates is None:
+                candidates = np.arange(len(self.row_ids))
+            candidates = _by_score(candidates, self.row_ids, scores)
+            ranks = self.names.verify_rows(query, candidates.tolist(), limit=1)
+        return int(self.row_ids[ranks[0]]) if ranks else None
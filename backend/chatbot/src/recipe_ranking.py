@@ -0,0 +1,84 @@
+import os
+import threading
+import weakref
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+# "coverage" ranks recipes by the share of their ingredients the store has
+# in stock (then by rating); "rating" ranks by rating alone
+RECIPE_RANKING = os.getenv("SAM_RECIPE_RANKING", "coverage")
+
+
+class IngredientCoverage:
+    """Scores every recipe by the fraction of its ingredients a store has in stock.
+
+    The recipes x ingredients matrix is built once from the recipe store's
+    ingredient codes. Per store, the IngredientSkuMap of its canonical
+    ingredient names to SKUs (inventory rows) becomes an ingredients x SKUs
+    matrix, rebuilt only when the table changes. Scoring is then two sparse
+    products: SKU stock -> ingredient availability -> recipe coverage.
+    """
+
+    def __init__(self, recipes):
+        codes = recipes.ingredient_codes
+        matrix = csr_matrix(
+            (np.ones(len(codes), dtype=np.float32), codes, recipes.ingredient_offsets),
+            shape=(len(recipes), len(recipes.vocab)),
+        )
+        # An ingredient listed twice in a recipe still counts once
+        matrix.sum_duplicates()
+        matrix.data[:] = 1
+        self.matrix = matrix
+        self.counts = np.asarray(matrix.sum(axis=1), dtype=np.float32).ravel()
+        self.vocab = recipes.vocab
+        self._sku_matrices = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _build_sku_matrix(self, sku_map):
+        ingredient_ids = []
+        sku_rows = []
+        for ingredient_id, ingredient in enumerate(self.vocab):
+            entry = sku_map.entries.get(sku_map.canonical.get(ingredient))
+            if entry is None:
+                continue
+            for row in entry[0]:
+                ingredient_ids.append(ingredient_id)
+                sku_rows.append(row)
+        return csr_matrix(
+            (np.ones(len(sku_rows), dtype=np.float32), (ingredient_ids, sku_rows)),
+            shape=(len(self.vocab), len(sku_map.store.frame)),
+        )
+
+    def sku_matrix(self, sku_map):
+        """Return the ingredients x SKUs matrix of a store's ingredient table."""
+        sku_map.sync()
+        # Stock changes don't touch the table, so the matrix survives them
+        key = (sku_map.generation, len(sku_map.store.frame))
+        with self._lock:
+            entry = self._sku_matrices.get(sku_map)
+            if entry is not None and entry[0] == key:
+                return entry[1]
+        matrix = self._build_sku_matrix(sku_map)
+        with self._lock:
+            self._sku_matrices[sku_map] = (key, matrix)
+        return matrix
+
+    def scores(self, sku_map):
+        """Return each recipe's fraction of ingredients in stock at the table's store."""
+        sku_matrix = self.sku_matrix(sku_map)
+        state = sku_map.store.state
+        frame = state.frame
+        stock = (
+            ~frame["outOfStock"].to_numpy(dtype=bool)
+            & (frame["availableQuantity"].to_numpy() > 0)
+        ).astype(np.float32)
+        if state.index.removed:
+            stock[list(state.index.removed)] = 0
+        # Rows added after the matrix was built aren't in the table yet
+        in_stock = np.zeros(sku_matrix.shape[1], dtype=np.float32)
+        rows = min(len(stock), len(in_stock))
+        in_stock[:rows] = stock[:rows]
+        available = (sku_matrix @ in_stock > 0).astype(np.float32)
+        covered = self.matrix @ available
+        return np.divide(covered, self.counts, out=np.zeros_like(covered), where=self.counts > 0)
@@ -0,0 +1,180 @@
+import ast
+import csv
+import io
+import re
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .recipe_index import DishNameIndex, RecipeIngredientIndex
+
+# Columns every request needs; the rest of a recipe is read from disk on demand
+RECIPE_COLUMNS = ["Name", "RecipeIngredientParts", "AggregatedRating"]
+
+QUOTED_ITEM_PATTERN = re.compile(r'"((?:[^"\\]|\\.)*)"')
+
+
+def parse_ingredient_parts(value):
+    """Parse an ingredient cell into a list of names.
+
+    Cells are R vectors like ``c("salt", "pepper")`` (``character(0)`` when
+    empty), a single quoted name, or a Python list literal.
+    """
+    if not isinstance(value, str):
+        return []
+    value = value.strip()
+    if value == "character(0)":
+        return []
+    if value.startswith(("c(", '"')):
+        return QUOTED_ITEM_PATTERN.findall(value)
+    try:
+        parsed = ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return [value] if value and value != "NA" else []
+    if isinstance(parsed, str):
+        return [parsed]
+    return [str(item) for item in parsed]
+
+
+def _record_offsets(path):
+    """Return the byte offset of every CSV record after the header, plus the end.
+
+    A record ends at the first newline with an even number of quotes
+    before it, so newlines inside quoted fields are skipped. Blank lines
+    are skipped like pandas does.
+    """
+    offsets = []
+    with open(path, "rb") as f:
+        position = len(f.readline())
+        start = position
+        quotes = 0
+        for line in f:
+            quotes += line.count(b'"')
+            position += len(line)
+            if quotes % 2:
+                continue
+            if line.strip() or position - start > len(line):
+                offsets.append(start)
+            start = position
+            quotes = 0
+    offsets.append(position)
+    return np.asarray(offsets, dtype=np.int64)
+
+
+class RecipeStore:
+    """Compact, read-only view of the recipe dataset.
+
+    Only names and ratings are kept as columns (float32 ratings). Every
+    ingredient list is parsed once at load into a flat array of codes into
+    an interned vocabulary, with per-recipe offsets (CSR layout), so
+    requests never re-parse the R-style strings. The heavy text columns
+    (instructions, descriptions, ...) stay on disk: ``details`` seeks to a
+    recipe's byte offset and parses just that record.
+    """
+
+    def __init__(self, names, ratings, ingredient_lists, path=None, offsets=None, header=None):
+        self.names = np.asarray(names, dtype=object)
+        self.ratings = np.asarray(ratings, dtype=np.float32)
+
+        vocab_ids = {}
+        codes = []
+        self.ingredient_offsets = np.zeros(len(self.names) + 1, dtype=np.int64)
+        for row, items in enumerate(ingredient_lists):
+            for item in items:
+                codes.append(vocab_ids.setdefault(sys.intern(item), len(vocab_ids)))
+            self.ingredient_offsets[row + 1] = len(codes)
+        self.vocab = list(vocab_ids)
+        self.ingredient_codes = np.asarray(codes, dtype=np.int32)
+
+        self.path = path
+        self.record_offsets = offsets
+        self.header = header
+        self._ingredient_index = None
+        self._dish_index = None
+        self._index_lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        """Load the light columns of a recipe CSV, or an empty store if it is missing."""
+        try:
+            frame = pd.read_csv(
+                path,
+                usecols=RECIPE_COLUMNS,
+                dtype={"Name": object, "RecipeIngredientParts": object},
+            )
+        except FileNotFoundError:
+            return cls([], [], [])
+        ratings = pd.to_numeric(frame["AggregatedRating"], errors="coerce")
+        ingredient_lists = (
+            parse_ingredient_parts(value) for value in frame["RecipeIngredientParts"]
+        )
+
+        offsets = _record_offsets(path)
+        if len(offsets) - 1 != len(frame):
+            print(f"Could not index the records of {path}; recipe details are unavailable")
+            offsets = None
+        with open(path, newline="", encoding="utf-8") as f:
+            header = next(csv.reader(f))
+        return cls(frame["Name"].fillna(""), ratings, ingredient_lists, path, offsets, header)
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def empty(self):
+        return len(self.names) == 0
+
+    def ingredients(self, row):
+        """Return the parsed ingredient list of a recipe."""
+        start, end = self.ingredient_offsets[row], self.ingredient_offsets[row + 1]
+        codes = self.ingredient_codes[start:end]
+        return [self.vocab[code] for code in codes.tolist()]
+
+    def rating(self, row):
+        rating = float(self.ratings[row])
+        return None if np.isnan(rating) else rating
+
+    @property
+    def ingredient_index(self):
+        """Inverted ingredient index over the store, built on first use."""
+        with self._index_lock:
+            if self._ingredient_index is None:
+                self._ingredient_index = RecipeIngredientIndex(
+                    ("\n".join(self.ingredients(row)) for row in range(len(self))),
+                    self.ratings,
+                )
+            return self._ingredient_index
+
+    @property
+    def dish_index(self):
+        """Dish-name index over the store, built on first use."""
+        with self._index_lock:
+            if self._dish_index is None:
+                self._dish_index = DishNameIndex(
+                    [str(name) for name in self.names], self.ratings
+                )
+            return self._dish_index
+
+    def details(self, row):
+        """Read every column of one recipe from disk, as a dict of strings."""
+        if self.record_offsets is None:
+            return None
+        start, end = self.record_offsets[row], self.record_offsets[row + 1]
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            record = f.read(end - start).decode("utf-8")
+        values = next(csv.reader(io.StringIO(record, newline="")))
+        return dict(zip(self.header, values))
+
+    def memory_usage(self):
+        """Approximate bytes held by the store, not counting its indexes."""
+        return (
+            self.names.nbytes
+            + sum(sys.getsizeof(name) for name in self.names)
+            + self.ratings.nbytes
+            + self.ingredient_codes.nbytes
+            + self.ingredient_offsets.nbytes
+            + sum(sys.getsizeof(item) for item in self.vocab)
+        )
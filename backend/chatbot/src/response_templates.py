@@ -0,0 +1,66 @@
+import os
+
+from .llm_utils import llm_available
+
+# When search results are rendered from templates instead of by the LLM:
+#   "llm"          never
+#   "template"     always
+#   "threshold:N"  when there are at most N product results
+#   "budget"       only while the LLM circuit breaker is open
+FORMAT_POLICY = os.getenv("SAM_FORMAT_POLICY", "threshold:1")
+
+# Results a template can describe; category listings keep their own text
+TEMPLATE_STATUSES = {"available", "out_of_stock", "not_found"}
+
+FOLLOW_UP = "Can I help you find anything else?"
+
+
+def use_template(results, policy=None):
+    """Decide whether a list of ProductResults is rendered locally under the policy."""
+    policy = (policy or FORMAT_POLICY).strip().lower()
+    if policy == "llm" or not results:
+        return False
+    if policy == "template" or not llm_available():
+        # With the breaker open the LLM would only return its raw fallback
+        return True
+    if policy.startswith("threshold:"):
+        # Category listings read better summarized, so only plain product hits count
+        if not all(result.status in TEMPLATE_STATUSES for result in results):
+            return False
+        try:
+            return len(results) <= int(policy.split(":", 1)[1])
+        except ValueError:
+            print(f"Invalid SAM_FORMAT_POLICY '{policy}', using the LLM")
+    return False
+
+
+def render_result(result):
+    """Render one ProductResult as a sentence."""
+    if result.status == "available":
+        return (
+            f"Yes, we have {result.name}! You'll find it in {result.location} "
+            f"({result.quantity} units available)."
+        )
+    if result.status == "out_of_stock":
+        return f"Sorry, {result.name} is out of stock right now."
+    if result.status == "not_found":
+        return f"Sorry, I couldn't find '{result.query}' in our store."
+    return result.message
+
+
+def _render_line(result):
+    if result.status == "available":
+        return f"{result.name}: {result.location} ({result.quantity} units available)"
+    if result.status == "out_of_stock":
+        return f"{result.name}: out of stock"
+    if result.status == "not_found":
+        return f"{result.query}: not in our store"
+    return result.message
+
+
+def render_inventory_response(results):
+    """Render ProductResults into one reply without calling the LLM."""
+    if len(results) == 1:
+        return f"{render_result(results[0])} {FOLLOW_UP}"
+    lines = [f"• {_render_line(result)}" for result in results]
+    return "Here's what I found:\n" + "\n".join(lines) + f"\n\n{FOLLOW_UP}"
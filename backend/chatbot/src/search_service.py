@@ -0,0 +1,288 @@
+"""Executor boundary for CPU-bound search work, and an event-loop lag monitor.
+
+Index lookups, fuzzy matching, pandas scans and intent classification are
+run through ``search_service`` instead of inline on the event loop, so one
+heavy search doesn't hold up every other session's frames.
+SAM_SEARCH_EXECUTOR picks where they run:
+
+- ``thread`` (default): a ThreadPoolExecutor
+- ``process``: a ProcessPoolExecutor, for large catalogs where the GIL
+  becomes the bottleneck. Each worker keeps its own inventory cache and
+  replays the stock deltas the main process has applied. Tasks carry only
+  the batches some worker hasn't replayed yet, and the main process drops
+  its logged batches once every worker has them.
+- ``inline``: run on the event loop as before
+
+Compare how much each mode delays the event loop under concurrent fuzzy
+searches with:
+
+    python -m chatbot.src.search_service <inventory.csv> [sessions]
+"""
+
+import asyncio
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .inventory_cache import get_store_inventory, inventory_cache
+
+SEARCH_EXECUTOR = os.getenv("SAM_SEARCH_EXECUTOR", "thread")
+# Pool size; unset uses the executor's default (CPU count for processes)
+SEARCH_WORKERS = int(os.getenv("SAM_SEARCH_WORKERS", "0")) or None
+# How often the lag monitor wakes up, and how many wake-ups it remembers
+LOOP_LAG_INTERVAL = float(os.getenv("SAM_LOOP_LAG_INTERVAL_SECONDS", "0.1"))
+LOOP_LAG_WINDOW = 600
+
+
+def _sync_store(csv_url, content_hash, base, deltas):
+    """Bring this worker's copy of a store in line with the main process.
+
+    ``deltas`` are the main process's batches from version ``base`` on.
+    Returns the synced version, or None if this copy is older than ``base``
+    (e.g. this worker started after the log was compacted).
+    """
+    store = get_store_inventory(csv_url)
+    if store.content_hash != content_hash:
+        # The main process has a newer load; fetch it too
+        inventory_cache.invalidate(csv_url)
+        store = get_store_inventory(csv_url)
+    if store.version < base:
+        return None
+    for batch in deltas[store.version - base :]:
+        inventory_cache.apply_deltas(csv_url, batch)
+    return base + len(deltas)
+
+
+def _call_on_store(csv_url, content_hash, base, deltas, fn, args):
+    version = _sync_store(csv_url, content_hash, base, deltas)
+    if version is None:
+        return os.getpid(), None, None
+    return os.getpid(), version, fn(*args)
+
+
+class SearchService:
+    """Runs search functions in a thread or process pool and awaits the result.
+
+    Functions are passed by reference, so in process mode they (and their
+    arguments and results) must be picklable: module-level functions and
+    plain data.
+    """
+
+    def __init__(self, mode=SEARCH_EXECUTOR, workers=SEARCH_WORKERS):
+        if mode not in ("thread", "process", "inline"):
+            raise ValueError(f"Unknown search executor '{mode}'")
+        self.mode = mode
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+        # csv_url -> (content_hash, {worker pid: delta version it has synced})
+        self._synced = {}
+        self.tasks = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                if self.mode == "process":
+                    # Forking a process that already runs threads is unsafe
+                    self._executor = ProcessPoolExecutor(
+                        self.workers, mp_context=multiprocessing.get_context("spawn")
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        self.workers, thread_name_prefix="sam-search"
+                    )
+            return self._executor
+
+    def _record(self, start):
+        elapsed = time.monotonic() - start
+        self.tasks += 1
+        self.wait_seconds += elapsed
+        self.max_wait_seconds = max(self.max_wait_seconds, elapsed)
+
+    async def run(self, fn, *args):
+        """Run fn(*args) off the event loop and return its result."""
+        start = time.monotonic()
+        try:
+            if self.mode == "inline":
+                return fn(*args)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self._record(start)
+
+    async def run_on_store(self, csv_url, fn, *args):
+        """Like run, for functions that read the cached inventory of csv_url.
+
+        In process mode the worker's copy of the store is first synced with
+        the main process's: same load, same deltas.
+        """
+        if self.mode != "process":
+            return await self.run(fn, *args)
+        # Revalidating the store may fetch and parse the CSV
+        store = await asyncio.to_thread(get_store_inventory, csv_url)
+        base, deltas = store.deltas_since(self._oldest_synced(csv_url, store))
+        pid, version, result = await self.run(
+            _call_on_store, csv_url, store.content_hash, base, deltas, fn, args
+        )
+        if version is None:
+            # That worker can't catch up from the compacted log; use this
+            # process's copy instead
+            self._forget_worker(csv_url, pid)
+            return await asyncio.to_thread(fn, *args)
+        self._record_synced(csv_url, store, pid, version)
+        return result
+
+    def _pool_size(self):
+        return self.workers or os.cpu_count() or 1
+
+    def _oldest_synced(self, csv_url, store):
+        """Return the delta version every worker has reached on this load of a store."""
+        with self._lock:
+            content_hash, versions = self._synced.get(csv_url, (None, {}))
+            if content_hash != store.content_hash or len(versions) < self._pool_size():
+                # Some worker hasn't synced this load yet
+                return 0
+            return min(versions.values())
+
+    def _record_synced(self, csv_url, store, pid, version):
+        with self._lock:
+            content_hash, versions = self._synced.get(csv_url, (None, {}))
+            if content_hash != store.content_hash:
+                versions = {}
+                self._synced[csv_url] = (store.content_hash, versions)
+            versions[pid] = max(versions.get(pid, 0), version)
+            if len(versions) >= self._pool_size():
+                store.compact_deltas(min(versions.values()))
+
+    def _forget_worker(self, csv_url, pid):
+        with self._lock:
+            self._synced.get(csv_url, (None, {}))[1].pop(pid, None)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._synced.clear()
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "tasks": self.tasks,
+            "wait_seconds": self.wait_seconds,
+            "max_wait_seconds": self.max_wait_seconds,
+        }
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes up from a short sleep.
+
+    The lag is how long ready callbacks (other sessions' frames) had to
+    wait; it stays near zero unless something blocks the loop.
+    """
+
+    def __init__(self, interval=LOOP_LAG_INTERVAL, window=LOOP_LAG_WINDOW):
+        self.interval = interval
+        self.samples = deque(maxlen=window)
+        self.max_lag = 0.0
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(loop.time() - start - self.interval, 0.0)
+            self.samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self):
+        """Return p50/p99/max wake-up lag in milliseconds over the recent window."""
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {"samples": 0, "p50_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+        return {
+            "samples": len(ordered),
+            "p50_ms": ordered[len(ordered) // 2] * 1000,
+            "p99_ms": ordered[min(int(len(ordered) * 0.99), len(ordered) - 1)] * 1000,
+            "max_ms": self.max_lag * 1000,
+        }
+
+
+search_service = SearchService()
+loop_lag_monitor = LoopLagMonitor()
+
+
+async def run_search(fn, *args):
+    """Run a CPU-bound search function through the shared SearchService."""
+    return await search_service.run(fn, *args)
+
+
+async def run_store_search(csv_url, fn, *args):
+    """Run a search function that reads the inventory of csv_url through the SearchService."""
+    return await search_service.run_on_store(csv_url, fn, *args)
+
+
+def search_service_stats():
+    """Return executor counters and the event-loop lag seen by the monitor."""
+    return {**search_service.stats(), "loop_lag": loop_lag_monitor.stats()}
+
+
+def _fuzzy_search(csv_url, query):
+    store = get_store_inventory(csv_url)
+    return store.matcher.close_matches(query, n=5, cutoff=0.6)
+
+
+async def _measure(mode, csv_url, sessions):
+    service = SearchService(mode)
+    # Start the workers (and load the store in them) before measuring
+    await asyncio.gather(
+        *(service.run_on_store(csv_url, _fuzzy_search, csv_url, "") for _ in range(os.cpu_count() or 1))
+    )
+    monitor = LoopLagMonitor(interval=0.005)
+    monitor.start()
+    queries = ["tomatoe", "choclate", "bisciut", "shampo"] * sessions
+    start = time.monotonic()
+    await asyncio.gather(*(service.run_on_store(csv_url, _fuzzy_search, csv_url, q) for q in queries))
+    elapsed = time.monotonic() - start
+    # Let the monitor see the end of the run before stopping it
+    await asyncio.sleep(monitor.interval * 2)
+    monitor.stop()
+    service.shutdown()
+    return elapsed, monitor.stats()
+
+
+def main(argv):
+    if not argv:
+        print("Usage: python -m chatbot.src.search_service <inventory.csv> [sessions]")
+        return 1
+    csv_url = argv[0]
+    sessions = int(argv[1]) if len(argv) > 1 else 50
+    get_store_inventory(csv_url)
+    for mode in ("inline", "thread", "process"):
+        elapsed, lag = asyncio.run(_measure(mode, csv_url, sessions))
+        print(
+            f"{mode:8s} {sessions * 4} fuzzy searches in {elapsed:.2f}s, "
+            f"loop lag p50 {lag['p50_ms']:.1f}ms p99 {lag['p99_ms']:.1f}ms max {lag['max_ms']:.1f}ms"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
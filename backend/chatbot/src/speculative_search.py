@@ -0,0 +1,139 @@
+import asyncio
+import os
+
+from .intent_cache import PUNCTUATION_PATTERN
+from .intent_classifier import classify_intent
+from .inventory_cache import get_store_inventory
+from .product_index import normalize_name
+from .product_search import lookup_product
+from .search_service import run_store_search
+
+# Look products up while the intent is still being extracted
+SPECULATIVE_SEARCH = os.getenv("SAM_SPECULATIVE_SEARCH", "1") == "1"
+MAX_CANDIDATES = 5
+# Longest run of query words tried as a product name
+MAX_NAME_WORDS = 4
+
+# "discarded_running" is how many discarded lookups are still queued or
+# running on a search worker; "wasted" counts those that ran to the end anyway
+_stats = {
+    "started": 0,
+    "confirmed": 0,
+    "discarded": 0,
+    "discarded_running": 0,
+    "wasted": 0,
+    "reused": 0,
+    "missed": 0,
+}
+
+
+def candidate_products(query, store):
+    """Guess which products a query asks for, without the LLM.
+
+    Uses the local classifier's product when it sees a product search;
+    otherwise the longest runs of query words that are product names in
+    the store.
+    """
+    parsed, _ = classify_intent(query)
+    if parsed is not None and parsed["intent"] == "product_search":
+        products = parsed["product"]
+        products = products if isinstance(products, list) else [products]
+        return [product.strip() for product in products if product.strip()][:MAX_CANDIDATES]
+
+    words = PUNCTUATION_PATTERN.sub(" ", str(query).lower()).split()
+    candidates = []
+    start = 0
+    while start < len(words) and len(candidates) < MAX_CANDIDATES:
+        for size in range(min(MAX_NAME_WORDS, len(words) - start), 0, -1):
+            name = " ".join(words[start : start + size])
+            if store.index.lookup_exact(name) is not None:
+                candidates.append(name)
+                start += size
+                break
+        else:
+            start += 1
+    return candidates
+
+
+def _speculate(query, inventory_csv_url):
+    store = get_store_inventory(inventory_csv_url)
+    return {
+        normalize_name(product): lookup_product(product, inventory_csv_url)
+        for product in candidate_products(query, store)
+    }
+
+
+def _drop_result(task):
+    # Retrieve the outcome nobody awaits, so a failure isn't reported as
+    # "Task exception was never retrieved"
+    if not task.cancelled():
+        task.exception()
+
+
+def _discarded_done(task):
+    _stats["discarded_running"] -= 1
+    _stats["wasted"] += 1
+    _drop_result(task)
+
+
+class SpeculativeSearch:
+    """Inventory lookups run while the intent of a query is being resolved.
+
+    The lookups start on the SearchService as soon as the query arrives, so
+    their latency overlaps the intent call. Once the intent is known,
+    ``settle`` hands them over for a product search and discards them for
+    anything else. Lookups only cover the non-interactive part of a search;
+    choosing between several matches still happens afterwards.
+
+    A discarded lookup that is already on a worker can't be stopped there
+    (cancelling the awaiting task wouldn't stop the executor job), so it
+    is left to finish and counted in the stats.
+    """
+
+    def __init__(self, query, inventory_csv_url, enabled=None):
+        enabled = SPECULATIVE_SEARCH if enabled is None else enabled
+        self._task = None
+        if enabled:
+            _stats["started"] += 1
+            self._task = asyncio.ensure_future(
+                run_store_search(inventory_csv_url, _speculate, query, inventory_csv_url)
+            )
+
+    def discard(self):
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        _stats["discarded"] += 1
+        if task.done():
+            _drop_result(task)
+            return
+        _stats["discarded_running"] += 1
+        task.add_done_callback(_discarded_done)
+
+    async def settle(self, intent, products):
+        """Return the lookups to reuse for these products, keyed by normalized product name."""
+        if self._task is None:
+            return {}
+        if intent != "product_search":
+            self.discard()
+            return {}
+
+        task, self._task = self._task, None
+        try:
+            lookups = await task
+        except Exception as e:
+            print(f"Speculative inventory lookup failed: {e}")
+            return {}
+
+        _stats["confirmed"] += 1
+        for product in products:
+            if normalize_name(product) in lookups:
+                _stats["reused"] += 1
+            elif product:
+                _stats["missed"] += 1
+        return lookups
+
+
+def speculative_search_stats():
+    """Return how often speculative lookups were confirmed, reused or discarded."""
+    return dict(_stats)
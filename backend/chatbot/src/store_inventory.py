@@ -0,0 +1,359 @@
+import mmap
+import threading
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from .category_views import CategoryViews
+from .fuzzy_match import FuzzyMatcher
+from .product_index import ProductIndex, normalize_name
+
+CATEGORICAL_COLUMNS = ["Category", "location", "name"]
+INT32_COLUMNS = ["availableQuantity", "weightInGms", "quantity"]
+TRUE_STRINGS = {"true", "1", "yes", "y", "t"}
+
+# Fields an "update" delta may change, and defaults for fields an "add" omits
+STOCK_COLUMNS = ["availableQuantity", "outOfStock", "quantity", "weightInGms"]
+NEW_ROW_DEFAULTS = {
+    "Category": "",
+    "name": "",
+    "availableQuantity": 0,
+    "weightInGms": 0,
+    "outOfStock": False,
+    "quantity": 0,
+    "location": "",
+}
+
+
+def _parse_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in TRUE_STRINGS
+    return bool(value)
+
+
+def _coerce_stock_value(column, value):
+    """Validate a delta's value for a stock column, converting it to the column's type."""
+    if column == "outOfStock":
+        if isinstance(value, (bool, np.bool_)):
+            return bool(value)
+        if isinstance(value, str) or (isinstance(value, (int, np.integer)) and value in (0, 1)):
+            return _parse_bool(value)
+        raise ValueError(f"outOfStock must be a boolean, got {value!r}")
+    try:
+        if isinstance(value, (bool, np.bool_)):
+            raise ValueError
+        number = float(value)
+        if not number.is_integer():
+            raise ValueError
+        number = int(number)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"{column} must be a whole number, got {value!r}") from None
+    if not 0 <= number <= np.iinfo(np.int32).max:
+        raise ValueError(f"{column} must be between 0 and {np.iinfo(np.int32).max}, got {value!r}")
+    return number
+
+
+def check_deltas(deltas):
+    """Raise ValueError for a batch StoreInventory.apply_deltas would reject.
+
+    Only the ops and values are checked, so no store has to be loaded;
+    which rows a delta selects is decided when it is applied.
+    """
+    for delta in deltas:
+        op = delta.get("op", "update")
+        if op not in ("update", "add", "remove"):
+            raise ValueError(f"Unknown delta op '{op}'")
+        if op != "add" and delta.get("location") is None and delta.get("name") is None:
+            raise ValueError(f"Delta needs a 'location' or a 'name': {delta}")
+        if op != "remove":
+            for column in STOCK_COLUMNS:
+                if delta.get(column) is not None:
+                    _coerce_stock_value(column, delta[column])
+
+
+def _is_mapped(array):
+    """Return whether an array's memory is a file mapping, e.g. a loaded snapshot."""
+    base = array
+    while base is not None:
+        if isinstance(base, mmap.mmap):
+            return True
+        base = base.obj if isinstance(base, memoryview) else getattr(base, "base", None)
+    return False
+
+
+def _mapped_nbytes(arrays):
+    return sum(array.nbytes for array in arrays if _is_mapped(array))
+
+
+def _to_bool(values):
+    if pd.api.types.is_bool_dtype(values):
+        return values.astype(bool)
+    return values.astype(str).str.strip().str.lower().isin(TRUE_STRINGS)
+
+
+def compact_inventory_frame(frame):
+    """Convert a raw inventory frame to compact dtypes.
+
+    Category, location and the (often repeated) names become categoricals,
+    the counts become int32, outOfStock becomes a real bool, and a
+    normalized ``name_lower`` column is added for the name index.
+    """
+    frame = frame.copy()
+    frame["name"] = frame["name"].fillna("").astype(str)
+    for column in CATEGORICAL_COLUMNS:
+        if column in frame:
+            frame[column] = frame[column].astype("category")
+    for column in INT32_COLUMNS:
+        if column in frame:
+            frame[column] = (
+                pd.to_numeric(frame[column], errors="coerce").fillna(0).astype("int32")
+            )
+    frame["outOfStock"] = _to_bool(frame["outOfStock"])
+    # Normalize each distinct name once rather than once per row
+    categories = frame["name"].cat.categories
+    lowered = dict(zip(categories, (normalize_name(name) for name in categories)))
+    frame["name_lower"] = frame["name"].map(lowered).astype("category")
+    return frame.reset_index(drop=True)
+
+
+def concat_inventory_frames(frames):
+    """Stack compact inventory frames, merging the categories of each column."""
+    if len(frames) == 1:
+        return frames[0]
+    columns = {}
+    for column in frames[0].columns:
+        first = frames[0][column]
+        if isinstance(first.dtype, pd.CategoricalDtype):
+            columns[column] = union_categoricals([frame[column].array for frame in frames])
+        else:
+            columns[column] = np.concatenate(
+                [frame[column].to_numpy().astype(first.dtype) for frame in frames]
+            )
+    return pd.DataFrame(columns)
+
+
+def load_inventory_frame(source):
+    """Parse a store inventory CSV (path, URL or file object) into a compact frame."""
+    frame = pd.read_csv(
+        source,
+        encoding="utf-8-sig",
+        dtype={"Category": "category", "location": "category"},
+    )
+    return compact_inventory_frame(frame)
+
+
+# A store's frame and the structures built over it. Deltas build a new one
+# and publish it in a single assignment, so a reader that takes ``state``
+# once never pairs rows or shapes from two versions.
+StoreState = namedtuple("StoreState", ["frame", "index", "matcher", "categories"])
+
+
+class StoreInventory:
+    """A store's inventory frame together with the lookup structures built over it.
+
+    ``frame``, ``index``, ``matcher`` and ``categories`` read the current
+    ``state``; readers that use more than one of them should take ``state``
+    once instead. ``version`` starts at 0 for every load and goes up by one
+    for each batch of deltas applied. ``delta_log`` keeps those batches in
+    order, so another copy of the same load can be brought up to date;
+    ``delta_base`` is the version its first batch applies to, which goes up
+    as batches no copy still needs are compacted away.
+    """
+
+    def __init__(self, frame, content_hash=None):
+        if "name_lower" not in frame:
+            frame = compact_inventory_frame(frame)
+        self.content_hash = content_hash
+        index = ProductIndex(frame["name_lower"].tolist(), normalized=True)
+        self.state = StoreState(frame, index, FuzzyMatcher(index), CategoryViews(frame))
+        self.version = 0
+        self.delta_log = []
+        self.delta_base = 0
+        self._delta_lock = threading.Lock()
+
+    @classmethod
+    def from_parts(cls, frame, index, matcher, content_hash=None):
+        """Assemble a StoreInventory from prebuilt parts, e.g. a loaded snapshot."""
+        store = cls.__new__(cls)
+        store.content_hash = content_hash
+        store.state = StoreState(frame, index, matcher, CategoryViews(frame))
+        store.version = 0
+        store.delta_log = []
+        store.delta_base = 0
+        store._delta_lock = threading.Lock()
+        return store
+
+    @property
+    def frame(self):
+        return self.state.frame
+
+    @property
+    def index(self):
+        return self.state.index
+
+    @property
+    def matcher(self):
+        return self.state.matcher
+
+    @property
+    def categories(self):
+        return self.state.categories
+
+    def rows(self, row_ids):
+        """Return the inventory rows at the given positions."""
+        return self.frame.iloc[row_ids]
+
+    @staticmethod
+    def _select_rows(state, delta):
+        """Return the live rows a delta refers to, by location or by name."""
+        if delta.get("location") is not None:
+            locations = state.frame["location"].cat
+            code = locations.categories.get_indexer([delta["location"]])[0]
+            rows = np.flatnonzero(locations.codes.to_numpy() == code) if code >= 0 else []
+        elif delta.get("name") is not None:
+            name = normalize_name(delta["name"])
+            rows = [
+                row
+                for row in state.index.substring_rows(name)
+                if state.index.norm_names[row] == name
+            ]
+        else:
+            raise ValueError(f"Delta needs a 'location' or a 'name': {delta}")
+        return [int(row) for row in rows if row not in state.index.removed]
+
+    @staticmethod
+    def _set_columns(frame, updates):
+        """Return a frame with the updates applied to copies of the columns they touch."""
+        columns = {}
+        for rows, values in updates:
+            if not rows:
+                continue
+            for column, value in values.items():
+                if column not in columns:
+                    # Also how columns mapped read-only from a snapshot get written
+                    columns[column] = frame[column].to_numpy().copy()
+                columns[column][rows] = value
+        if not columns:
+            return frame
+        frame = frame.copy(deep=False)
+        for column, values in columns.items():
+            frame[column] = values
+        return frame
+
+    def apply_deltas(self, deltas):
+        """Apply stock deltas in place and return the new inventory version.
+
+        Each delta is a dict with an ``op``:
+
+        - ``"update"`` (the default) sets any of availableQuantity,
+          outOfStock, quantity and weightInGms on the rows it selects
+        - ``"add"`` appends a new product from the usual CSV columns
+        - ``"remove"`` drops the rows it selects from every lookup
+
+        Updates and removals select rows by ``location`` if given, otherwise
+        by exact ``name``; adds are applied after them. Quantities must be
+        whole numbers >= 0 (numeric strings are accepted) and outOfStock a
+        boolean or a boolean string. Updates only copy the columns and
+        category views they touch, adds go to the index overflow lists and
+        removals are tombstoned, so nothing is re-parsed or re-indexed. The
+        result is published as a new ``state``; the old one is not changed.
+        """
+        with self._delta_lock:
+            state = self.state
+            # Resolve every delta before changing anything, so a bad entry
+            # rejects the whole batch instead of applying part of it
+            updates = []
+            added = []
+            removed = []
+            for delta in deltas:
+                op = delta.get("op", "update")
+                if op == "add":
+                    record = {key: value for key, value in delta.items() if key != "op"}
+                    for column in STOCK_COLUMNS:
+                        if record.get(column) is not None:
+                            record[column] = _coerce_stock_value(column, record[column])
+                    added.append(record)
+                elif op == "remove":
+                    removed.extend(self._select_rows(state, delta))
+                elif op == "update":
+                    values = {
+                        column: _coerce_stock_value(column, delta[column])
+                        for column in STOCK_COLUMNS
+                        if delta.get(column) is not None
+                    }
+                    updates.append((self._select_rows(state, delta), values))
+                else:
+                    raise ValueError(f"Unknown delta op '{op}'")
+
+            frame, index, matcher, categories = state
+            frame = self._set_columns(frame, updates)
+            changed_rows = [row for rows, _ in updates for row in rows]
+
+            if added or removed:
+                index = index.copy()
+                names = []
+                if added:
+                    rows = compact_inventory_frame(
+                        pd.DataFrame([{**NEW_ROW_DEFAULTS, **record} for record in added])
+                    )
+                    frame = concat_inventory_frames([frame, rows[frame.columns]])
+                    names = rows["name_lower"].tolist()
+                    index.add(names)
+                if removed:
+                    index.remove(removed)
+                matcher = matcher.extended(index, names)
+                categories = CategoryViews(frame, index.removed)
+            elif changed_rows:
+                categories = categories.updated(frame, changed_rows)
+            self.state = StoreState(frame, index, matcher, categories)
+
+            self.delta_log.append(list(deltas))
+            self.version += 1
+            return self.version
+
+    def deltas_since(self, version):
+        """Return the logged batches that bring a copy at ``version`` up to date.
+
+        Returns ``(base, batches)``, where ``base`` is the version the first
+        batch applies to; it is later than ``version`` if those batches were
+        compacted.
+        """
+        with self._delta_lock:
+            start = max(version - self.delta_base, 0)
+            return self.delta_base + start, self.delta_log[start:]
+
+    def compact_deltas(self, version):
+        """Drop the logged batches up to ``version``, once no copy needs them."""
+        with self._delta_lock:
+            drop = min(version, self.version) - self.delta_base
+            if drop > 0:
+                del self.delta_log[:drop]
+                self.delta_base += drop
+
+    def memory_usage(self):
+        """Return the bytes held by this store, broken down by structure.
+
+        Arrays mapped from a snapshot file are shared with every other
+        process mapping it and can be paged out, so they are reported as
+        ``mapped`` rather than counted in the structures and the total.
+        """
+        state = self.state
+        frame = state.frame
+        columns = (frame[column] for column in frame.columns)
+        frame_mapped = _mapped_nbytes(
+            (column.cat.codes if isinstance(column.dtype, pd.CategoricalDtype) else column).to_numpy()
+            for column in columns
+        )
+        index_mapped = _mapped_nbytes((state.index.postings, state.index.offsets))
+        matcher_mapped = _mapped_nbytes((state.matcher.lengths,))
+        usage = {
+            "frame": int(frame.memory_usage(deep=True).sum()) - frame_mapped,
+            "index": state.index.memory_usage() - index_mapped,
+            "matcher": state.matcher.memory_usage() - matcher_mapped,
+            "categories": state.categories.memory_usage(),
+        }
+        usage["total"] = sum(usage.values())
+        usage["mapped"] = frame_mapped + index_mapped + matcher_mapped
+        return usage
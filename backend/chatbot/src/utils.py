@@ -4,6 +4,7 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 inventory_csv_path = os.path.join(BASE_DIR,"../data/walmart_format.csv" )
 sustainable_csv_path = os.path.join(BASE_DIR,"../data/Sustainable_List.csv")
+recipes_csv_path = os.path.join(BASE_DIR,"../data/recipes.csv")
 
 
 
@@ -0,0 +1,29 @@
+import difflib
+
+from chatbot.src.fuzzy_match import FuzzyMatcher
+from chatbot.src.product_index import ProductIndex
+
+
+def test_short_close_match_survives_many_longer_candidates():
+    # 150 longer names contain the whole query, so they share more trigrams
+    # with it than the misspelt short name that difflib ranks first
+    names = [f"green tea pack {i}" for i in range(100, 250)] + ["gren tea"]
+    matcher = FuzzyMatcher(ProductIndex(names))
+
+    rows = matcher.close_matches("green tea", n=3)
+    expected = difflib.get_close_matches("green tea", names, n=3, cutoff=0.6)
+    assert names[rows[0]] == expected[0] == "gren tea"
+
+    def score(name):
+        return difflib.SequenceMatcher(None, name, "green tea").ratio()
+
+    assert [score(names[row]) for row in rows] == [score(name) for name in expected]
+
+
+def test_results_match_difflib_below_the_candidate_cap():
+    names = ["basmati rice", "brown rice", "rice flour", "rice bran oil", "ice cream", "price tag"]
+    matcher = FuzzyMatcher(ProductIndex(names))
+    for query in ["rice", "basmti rice", "ice crem", "rise flour"]:
+        rows = matcher.close_matches(query, n=3)
+        expected = difflib.get_close_matches(query, names, n=3, cutoff=0.6)
+        assert sorted(names[row] for row in rows) == sorted(expected)
@@ -0,0 +1,39 @@
+from chatbot.src.ingredient_map import IngredientSkuMaps
+from chatbot.src.inventory_cache import get_store_inventory, inventory_cache
+
+CSV_BODY = (
+    "Category,name,availableQuantity,weightInGms,outOfStock,quantity,location\n"
+    "Fruits & Vegetables,Onion,3,1000,FALSE,1,Aisle 1-a\n"
+    "Fruits & Vegetables,Tomato Hybrid,0,1000,TRUE,1,Aisle 1-b\n"
+    "Cooking Essentials,Garlic Paste,5,200,FALSE,1,Aisle 3-c\n"
+)
+
+
+def _write_store(tmp_path, name):
+    path = str(tmp_path / name)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(CSV_BODY)
+    return path
+
+
+def test_table_counts_towards_the_budget_and_leaves_with_its_store(tmp_path, monkeypatch):
+    first = _write_store(tmp_path, "first.csv")
+    second = _write_store(tmp_path, "second.csv")
+    monkeypatch.setattr(inventory_cache, "max_bytes", 0)
+    maps = IngredientSkuMaps(["2 onions, chopped", "1 tomato", "garlic"])
+
+    store = get_store_inventory(first)
+    before = inventory_cache.stats()["bytes"]
+    sku_map = maps.get(first)
+    assert sku_map.candidate_rows("onion") == ([0], True)
+    assert inventory_cache.stats()["bytes"] == before + sku_map.memory_usage()
+
+    # Room for one store only: loading the second evicts the first and its table
+    inventory_cache.max_bytes = inventory_cache.stats()["bytes"] + 1
+    get_store_inventory(second)
+    assert first not in maps._maps
+    assert maps.get(first).store is not store
+
+    inventory_cache.invalidate(first)
+    assert first not in maps._maps
+    inventory_cache.invalidate()
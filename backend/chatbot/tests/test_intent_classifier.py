@@ -0,0 +1,77 @@
+import pytest
+
+from chatbot.src.intent_classifier import (
+    INTENT_CONFIDENCE_THRESHOLD,
+    benchmark,
+    classify_intent,
+)
+
+
+def _bypasses(query):
+    parsed, confidence = classify_intent(query)
+    return parsed is not None and confidence >= INTENT_CONFIDENCE_THRESHOLD
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "what do I need for a birthday party",
+        "how to make money",
+        "I want to eat something healthy",
+        "I want to make a cake and cookies",
+        "how do I make friends",
+        "recipe for disaster",
+        "I'd like to make a reservation",
+    ],
+)
+def test_non_food_captures_go_to_the_llm(query):
+    assert not _bypasses(query)
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "where are you located",
+        "where is my order",
+        "do you have time",
+        "I want a refund",
+        "is there a pharmacy nearby",
+        "find me a job",
+        "show me the money",
+    ],
+)
+def test_service_questions_are_not_product_searches(query):
+    assert not _bypasses(query)
+
+
+def test_weak_leads_bypass_only_for_known_products():
+    assert _bypasses("I want some apples")
+    assert not _bypasses("I want a new phone")
+    assert _bypasses("do you have a new phone")
+
+
+@pytest.mark.parametrize(
+    "query, intent, product",
+    [
+        ("ingredients for mac and cheese", "dish_ingredients", "mac and cheese"),
+        ("how do I make a chocolate cake", "dish_ingredients", "chocolate cake"),
+        ("I want to cook ramen", "dish_ingredients", "ramen"),
+        ("what can I cook with chicken and rice", "recipe", ["chicken", "rice"]),
+        ("recipes with potatoes", "recipe", "potatoes"),
+    ],
+)
+def test_known_dishes_and_ingredients_bypass(query, intent, product):
+    parsed, confidence = classify_intent(query)
+    assert confidence >= INTENT_CONFIDENCE_THRESHOLD
+    assert parsed["intent"] == intent
+    assert parsed["product"] == product
+
+
+def test_conjunctions_are_split():
+    parsed, _ = classify_intent("I want to make a cake and cookies")
+    assert parsed["product"] == ["cake", "cookies"]
+
+
+def test_benchmark_has_no_wrong_bypasses():
+    report = benchmark()
+    assert report["misses"] == []
@@ -0,0 +1,60 @@
+import pytest
+
+from chatbot.src.inventory_cache import InventoryCache
+
+CSV_BODY = (
+    "Category,name,availableQuantity,weightInGms,outOfStock,quantity,location\n"
+    "Fruits & Vegetables,Onion,3,1000,FALSE,1,Aisle 1-a\n"
+    "Snacks,Potato Chips,12,50,FALSE,1,Aisle 9-c\n"
+)
+
+
+@pytest.fixture
+def csv_url(tmp_path):
+    path = tmp_path / "inventory.csv"
+    path.write_text(CSV_BODY, encoding="utf-8")
+    return str(path)
+
+
+def _stock(store, name):
+    frame = store.frame
+    return int(frame.loc[frame["name"] == name, "availableQuantity"].iloc[0])
+
+
+def test_deltas_are_replayed_after_invalidation(csv_url):
+    cache = InventoryCache()
+    cache.get(csv_url)
+    assert cache.apply_deltas(csv_url, [{"name": "Onion", "availableQuantity": 7}]) == 1
+    assert cache.apply_deltas(csv_url, [{"op": "add", "name": "Garlic", "availableQuantity": 4}]) == 2
+
+    cache.invalidate(csv_url)
+    store = cache.get(csv_url)
+    assert store.version == 2
+    assert _stock(store, "Onion") == 7
+    assert _stock(store, "Garlic") == 4
+
+
+def test_deltas_for_an_uncached_store_wait_for_its_load(csv_url):
+    cache = InventoryCache()
+    assert cache.apply_deltas(csv_url, [{"name": "Onion", "availableQuantity": 0}]) == 1
+    assert cache.stats()["stores"] == 0 and cache.misses == 0
+
+    with pytest.raises(ValueError):
+        cache.apply_deltas(csv_url, [{"name": "Onion", "availableQuantity": -1}])
+
+    store = cache.get(csv_url)
+    assert store.version == 1
+    assert _stock(store, "Onion") == 0
+
+
+def test_a_changed_csv_starts_a_new_delta_log(csv_url, tmp_path):
+    cache = InventoryCache(ttl=0)
+    cache.get(csv_url)
+    cache.apply_deltas(csv_url, [{"name": "Onion", "availableQuantity": 7}])
+
+    (tmp_path / "inventory.csv").write_text(CSV_BODY.replace("Onion,3", "Onion,5"), encoding="utf-8")
+    store = cache.get(csv_url)
+    assert store.version == 0
+    assert _stock(store, "Onion") == 5
+    cache.invalidate(csv_url)
+    assert cache.get(csv_url).version == 0
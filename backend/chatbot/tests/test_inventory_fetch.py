@@ -0,0 +1,141 @@
+import gzip
+import hashlib
+import io
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from chatbot.src.inventory_cache import InventoryCache
+from chatbot.src.inventory_fetch import fetch_inventory, parse_inventory_stream
+
+CSV_BODY = (
+    "Category,name,availableQuantity,weightInGms,outOfStock,quantity,location\n"
+    "Fruits & Vegetables,Onion,3,1000,FALSE,1,Aisle 1-a\n"
+    "Fruits & Vegetables,Tomato Hybrid,0,1000,TRUE,1,Aisle 1-b\n"
+    "Snacks,Potato Chips,12,50,FALSE,1,Aisle 9-c\n"
+).encode("utf-8")
+ETAG = '"%s"' % hashlib.md5(CSV_BODY).hexdigest()
+LAST_MODIFIED = "Wed, 01 Oct 2025 10:00:00 GMT"
+
+
+class _InventoryServer:
+    """Serves CSV_BODY over HTTP on an ephemeral port and records each request."""
+
+    def __init__(self):
+        self.validators = {"ETag": ETAG, "Last-Modified": LAST_MODIFIED}
+        self.gzip = True
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                headers = dict(self.headers)
+                unchanged = (
+                    "ETag" in server.validators
+                    and headers.get("If-None-Match") == server.validators["ETag"]
+                ) or (
+                    "Last-Modified" in server.validators
+                    and headers.get("If-Modified-Since") == server.validators["Last-Modified"]
+                )
+                status = 304 if unchanged else 200
+                server.requests.append((status, headers))
+
+                self.send_response(status)
+                for name, value in server.validators.items():
+                    self.send_header(name, value)
+                if status == 304:
+                    self.end_headers()
+                    return
+                body = CSV_BODY
+                if server.gzip and "gzip" in headers.get("Accept-Encoding", ""):
+                    body = gzip.compress(body)
+                    self.send_header("Content-Encoding", "gzip")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._httpd.server_port}/inventory.csv"
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def statuses(self):
+        return [status for status, _ in self.requests]
+
+
+@pytest.fixture
+def server():
+    server = _InventoryServer()
+    yield server
+    server.close()
+
+
+def _expected_frame():
+    return parse_inventory_stream(io.BytesIO(CSV_BODY))[0]
+
+
+def test_200_returns_frame_and_validators(server):
+    server.gzip = False
+    fetched = fetch_inventory(server.url)
+
+    assert not fetched.not_modified
+    assert fetched.frame.equals(_expected_frame())
+    assert fetched.content_hash == hashlib.sha256(CSV_BODY).hexdigest()
+    assert fetched.etag == ETAG
+    assert fetched.last_modified == LAST_MODIFIED
+    assert server.statuses() == [200]
+
+
+def test_gzip_body_is_decoded_while_parsing(server):
+    fetched = fetch_inventory(server.url)
+
+    status, headers = server.requests[0]
+    assert status == 200
+    assert "gzip" in headers["Accept-Encoding"]
+    assert fetched.frame.equals(_expected_frame())
+    # The hash covers the decoded CSV, not the compressed transfer
+    assert fetched.content_hash == hashlib.sha256(CSV_BODY).hexdigest()
+
+
+def test_304_reuses_the_cached_store(server):
+    fetched = fetch_inventory(server.url)
+    again = fetch_inventory(server.url, fetched.etag, fetched.last_modified)
+    assert again.not_modified
+    assert again.etag == ETAG
+
+    cache = InventoryCache(ttl=0)
+    first = cache.get(server.url)
+    second = cache.get(server.url)
+    assert second is first
+    status, headers = server.requests[-1]
+    assert status == 304
+    assert headers["If-None-Match"] == ETAG
+
+
+def test_last_modified_alone_is_enough_for_a_304(server):
+    server.validators = {"Last-Modified": LAST_MODIFIED}
+    cache = InventoryCache(ttl=0)
+    first = cache.get(server.url)
+    assert cache.get(server.url) is first
+    assert server.statuses() == [200, 304]
+    assert "If-None-Match" not in server.requests[-1][1]
+
+
+def test_without_validators_falls_back_to_the_content_hash(server):
+    server.validators = {}
+    fetched = fetch_inventory(server.url)
+    assert fetched.etag is None and fetched.last_modified is None
+
+    cache = InventoryCache(ttl=0)
+    first = cache.get(server.url)
+    second = cache.get(server.url)
+    # Every revalidation downloads the body, but an unchanged body keeps the built store
+    assert server.statuses() == [200, 200, 200]
+    assert second is first
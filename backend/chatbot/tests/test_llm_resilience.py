@@ -0,0 +1,41 @@
+import threading
+
+import pytest
+import requests
+
+from chatbot.src.llm_resilience import CircuitBreaker, LatencyBudget
+
+
+def test_sync_timeouts_are_counted():
+    budget = LatencyBudget(CircuitBreaker(failures=10))
+
+    def timed_out():
+        raise requests.exceptions.ReadTimeout("read timed out")
+
+    def refused():
+        raise requests.exceptions.ConnectionError("connection refused")
+
+    for _ in range(2):
+        with pytest.raises(requests.exceptions.Timeout):
+            budget.call("chat", timed_out)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        budget.call("chat", refused)
+
+    assert budget.stats()["timeouts"] == {"chat": 2}
+    assert budget.stats()["breaker"]["consecutive_failures"] == 3
+
+
+def test_latencies_from_many_threads_are_all_kept():
+    budget = LatencyBudget()
+
+    def calls():
+        for _ in range(50):
+            budget.call("chat", lambda: None)
+
+    threads = [threading.Thread(target=calls) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(budget._latencies["chat"]) == 200
+    assert budget.p95("chat") is not None
@@ -0,0 +1,86 @@
+import asyncio
+import json
+
+import httpx
+
+from chatbot.src import llm_utils
+from chatbot.src.llm_resilience import CircuitBreaker, LatencyBudget
+
+
+def _sse_body(chunks):
+    events = [": keep-alive"]
+    for chunk in chunks:
+        events.append("data: " + json.dumps({"choices": [{"delta": {"content": chunk}}]}))
+    events.append("data: [DONE]")
+    return ("\n\n".join(events) + "\n\n").encode("utf-8")
+
+
+def _use_fake_endpoint(monkeypatch, chunks, status=200):
+    """Point the pooled client at an in-process stand-in for the streaming API."""
+    requests_seen = []
+
+    def handler(request):
+        requests_seen.append(json.loads(request.content))
+        return httpx.Response(
+            status,
+            headers={"content-type": "text/event-stream"},
+            content=_sse_body(chunks),
+        )
+
+    def get_client():
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    monkeypatch.setattr(llm_utils, "get_async_client", get_client)
+    monkeypatch.setattr(
+        llm_utils, "_budget", LatencyBudget(CircuitBreaker(failures=3, reset_after=60))
+    )
+    return requests_seen
+
+
+def test_stream_forwards_every_chunk(monkeypatch):
+    requests_seen = _use_fake_endpoint(monkeypatch, ["Aisle ", "4, ", "3 units."])
+    deltas = []
+
+    async def on_delta(text):
+        deltas.append(text)
+
+    reply = asyncio.run(
+        llm_utils.format_inventory_response_async(["Onion: available"], on_delta=on_delta)
+    )
+
+    assert reply == "Aisle 4, 3 units."
+    assert deltas == ["Aisle ", "4, ", "3 units."]
+    assert requests_seen[0]["stream"] is True
+    assert llm_utils._budget.breaker.stats()["state"] == "closed"
+
+
+def test_upstream_errors_fall_back_and_count(monkeypatch):
+    _use_fake_endpoint(monkeypatch, [], status=500)
+
+    async def on_delta(text):
+        pass
+
+    for _ in range(3):
+        reply = asyncio.run(
+            llm_utils.format_inventory_response_async(["Onion: available"], on_delta=on_delta)
+        )
+        assert reply == llm_utils._inventory_fallback(["Onion: available"])
+    assert llm_utils._budget.breaker.stats()["state"] == "open"
+
+
+def test_client_going_away_is_not_an_llm_failure(monkeypatch):
+    _use_fake_endpoint(monkeypatch, ["Aisle ", "4, ", "3 units."])
+
+    async def on_delta(text):
+        raise ConnectionResetError("websocket closed")
+
+    # More disconnects than it takes to open the breaker
+    for _ in range(5):
+        asyncio.run(
+            llm_utils.format_inventory_response_async(["Onion: available"], on_delta=on_delta)
+        )
+
+    stats = llm_utils._budget.breaker.stats()
+    assert stats["state"] == "closed"
+    assert stats["consecutive_failures"] == 0
+    assert llm_utils.llm_available()
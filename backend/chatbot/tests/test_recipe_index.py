@@ -0,0 +1,27 @@
+import pytest
+
+from chatbot.src.recipe_index import RecipeIngredientIndex
+
+TEXTS = [
+    'c("eggs", "garlic", "olive oil")',
+    'c("eggplant", "salt")',
+    'c("chicken breast", "soy sauce", "ginger")',
+    'c("rice", "peas", "egg")',
+]
+RATINGS = [4.0, 5.0, 3.0, None]
+
+
+@pytest.mark.parametrize("word", ["egg", "eggs", "oil", "gg", "o", "ce", "garlic", "zz", "xyz"])
+def test_word_ranks_match_a_scan_of_the_vocabulary(word):
+    index = RecipeIngredientIndex(TEXTS, RATINGS)
+    expected = sorted(
+        {rank for rank, text in enumerate(index.texts) for token in text.split() if word in token}
+    )
+    assert index.word_ranks(word).tolist() == expected
+
+
+def test_search_finds_substrings_best_rated_first():
+    index = RecipeIngredientIndex(TEXTS, RATINGS)
+    assert index.search(["egg"]) == [1, 0, 3]
+    assert index.search(["egg", "garlic"]) == [0]
+    assert index.search(["ce"]) == [2, 3]
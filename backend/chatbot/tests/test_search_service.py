@@ -0,0 +1,48 @@
+import asyncio
+
+from chatbot.src.inventory_cache import apply_inventory_deltas, get_store_inventory
+from chatbot.src.search_service import SearchService
+
+CSV_BODY = (
+    "Category,name,availableQuantity,weightInGms,outOfStock,quantity,location\n"
+    "Fruits & Vegetables,Onion,3,1000,FALSE,1,Aisle 1-a\n"
+    "Snacks,Potato Chips,12,50,FALSE,1,Aisle 9-c\n"
+)
+
+
+def _onion_stock(csv_url):
+    frame = get_store_inventory(csv_url).frame
+    return int(frame.loc[frame["name"] == "Onion", "availableQuantity"].iloc[0])
+
+
+def test_process_workers_replay_deltas_and_the_log_is_compacted(tmp_path):
+    csv_url = str(tmp_path / "inventory.csv")
+    with open(csv_url, "w", encoding="utf-8") as f:
+        f.write(CSV_BODY)
+    store = get_store_inventory(csv_url)
+    service = SearchService("process", workers=2)
+
+    async def run_on_every_worker():
+        # Enough concurrent tasks that both workers pick some up
+        return await asyncio.gather(
+            *(service.run_on_store(csv_url, _onion_stock, csv_url) for _ in range(16))
+        )
+
+    try:
+        assert asyncio.run(run_on_every_worker()) == [3] * 16
+        for quantity in (5, 7, 9):
+            apply_inventory_deltas(csv_url, [{"name": "Onion", "availableQuantity": quantity}])
+        assert store.version == 3 and len(store.delta_log) == 3
+
+        for _ in range(5):
+            assert asyncio.run(run_on_every_worker()) == [9] * 16
+            if not store.delta_log:
+                break
+        # Both workers have replayed every batch, so the log was dropped
+        assert store.delta_base == 3 and store.delta_log == []
+
+        apply_inventory_deltas(csv_url, [{"name": "Onion", "availableQuantity": 4}])
+        assert store.deltas_since(3) == (3, [[{"name": "Onion", "availableQuantity": 4}]])
+        assert asyncio.run(run_on_every_worker()) == [4] * 16
+    finally:
+        service.shutdown()
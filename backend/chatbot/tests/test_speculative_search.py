@@ -0,0 +1,39 @@
+import asyncio
+import gc
+
+from chatbot.src import speculative_search
+from chatbot.src.speculative_search import SpeculativeSearch, speculative_search_stats
+
+
+def test_discarded_lookups_finish_and_are_counted(monkeypatch):
+
+    async def failing_search(csv_url, fn, *args):
+        await asyncio.sleep(0.01)
+        raise RuntimeError("worker failed")
+
+    monkeypatch.setattr(speculative_search, "run_store_search", failing_search)
+    monkeypatch.setattr(speculative_search, "_stats", dict.fromkeys(speculative_search._stats, 0))
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        unhandled = []
+        loop.set_exception_handler(lambda loop, context: unhandled.append(context))
+
+        running = SpeculativeSearch("do you have milk", "store.csv", enabled=True)
+        assert await running.settle("greeting", []) == {}
+        assert speculative_search_stats()["discarded_running"] == 1
+
+        finished = SpeculativeSearch("do you have eggs", "store.csv", enabled=True)
+        await asyncio.sleep(0.05)
+        finished.discard()
+
+        del running, finished
+        gc.collect()
+        await asyncio.sleep(0)
+        return unhandled
+
+    assert asyncio.run(run()) == []
+    stats = speculative_search_stats()
+    assert stats["discarded"] == 2
+    assert stats["discarded_running"] == 0
+    assert stats["wasted"] == 1
@@ -0,0 +1,77 @@
+import pandas as pd
+
+from chatbot.src.inventory_snapshot import load_snapshot, write_snapshot
+from chatbot.src.store_inventory import StoreInventory
+
+
+def _store():
+    return StoreInventory(
+        pd.DataFrame(
+            {
+                "Category": ["Fruits & Vegetables", "Fruits & Vegetables", "Snacks"],
+                "name": ["Onion", "Tomato Hybrid", "Potato Chips"],
+                "availableQuantity": [3, 0, 12],
+                "weightInGms": [1000, 1000, 50],
+                "outOfStock": [False, True, False],
+                "quantity": [1, 1, 1],
+                "location": ["Aisle 1-a", "Aisle 1-b", "Aisle 9-c"],
+            }
+        )
+    )
+
+
+def test_deltas_publish_a_new_state_and_leave_the_old_one_alone():
+    store = _store()
+    before = store.state
+    store.apply_deltas(
+        [
+            {"name": "Tomato Hybrid", "availableQuantity": 4, "outOfStock": False},
+            {"op": "add", "Category": "Snacks", "name": "Nachos", "availableQuantity": 2},
+            {"op": "remove", "name": "Potato Chips"},
+        ]
+    )
+    after = store.state
+
+    # A reader still holding the old state sees the old version throughout
+    assert before.frame["availableQuantity"].tolist() == [3, 0, 12]
+    assert len(before.frame) == len(before.index) == len(before.matcher.lengths) == 3
+    assert not before.index.removed
+    assert before.index.lookup_exact("nachos") is None
+    assert before.categories.get("Fruits & Vegetables").available_count == 1
+
+    assert after.frame["availableQuantity"].tolist() == [3, 4, 12, 2]
+    assert len(after.frame) == len(after.index) == len(after.matcher.lengths) == 4
+    assert after.index.removed == {2}
+    assert after.index.lookup_exact("nachos") == 3
+    assert after.matcher.close_matches("nacho") == [3]
+    assert after.categories.get("Fruits & Vegetables").available_count == 2
+    assert after.categories.get("Snacks").rows.tolist() == [3]
+
+
+def test_stock_updates_copy_only_the_columns_they_touch():
+    store = _store()
+    before = store.state
+    store.apply_deltas([{"name": "Onion", "availableQuantity": 0}])
+
+    assert store.frame["availableQuantity"].tolist() == [0, 0, 12]
+    assert before.frame["availableQuantity"].tolist() == [3, 0, 12]
+    assert store.index is before.index
+    assert store.categories.get("Fruits & Vegetables").available_count == 0
+    assert before.categories.get("Fruits & Vegetables").available_count == 1
+
+
+def test_snapshot_pages_are_reported_as_mapped_not_private(tmp_path):
+    path = str(tmp_path / "store.samsnap")
+    write_snapshot(_store(), path)
+    store = load_snapshot(path)
+
+    usage = store.memory_usage()
+    assert usage["mapped"] > 0
+    assert usage["total"] == usage["frame"] + usage["index"] + usage["matcher"] + usage["categories"]
+    assert usage["total"] < _store().memory_usage()["total"]
+
+    # A written column is copied out of the mapping and becomes private
+    store.apply_deltas([{"name": "Onion", "availableQuantity": 5}])
+    updated = store.memory_usage()
+    assert updated["mapped"] == usage["mapped"] - store.frame["availableQuantity"].to_numpy().nbytes
+    assert updated["total"] > usage["total"]